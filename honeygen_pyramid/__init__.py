@@ -1,9 +1,10 @@
-from pyramid.authorization import ACLAuthorizationPolicy
 from pyramid.config import Configurator
+from pyramid.tweens import EXCVIEW, INGRESS
 
+from honeygen_pyramid.authorization import CompiledACLAuthorizationPolicy
 from honeygen_pyramid.base_resource import Root
 from honeygen_pyramid.exposed import all_models
-from honeygen_pyramid.jwt import get_user_jwt, JWTAuthenticationPolicy
+from honeygen_pyramid.jwt import get_principals, get_user_jwt, JWTAuthenticationPolicy
 from .src import *  # It is important that we import all the models
 
 
@@ -11,9 +12,17 @@ def main(global_config, **settings):
     config = Configurator(settings=settings,
                           root_factory='.base_resource.Root',
                           authentication_policy=JWTAuthenticationPolicy(),
-                          authorization_policy=ACLAuthorizationPolicy())
+                          authorization_policy=CompiledACLAuthorizationPolicy())
     config.include('pyramid_sqlalchemy')
     config.add_request_method(get_user_jwt, name=str('user'), reify=True)
+    config.add_request_method(get_principals, name=str('principals'), reify=True)
+    config.add_tween('honeygen_pyramid.slowlog.slow_log_tween_factory', under=INGRESS)
+    config.add_tween('honeygen_pyramid.compression.compression_tween_factory',
+                     under='honeygen_pyramid.slowlog.slow_log_tween_factory')
+    config.add_tween('honeygen_pyramid.ratelimit.rate_limit_tween_factory', under=EXCVIEW)
+    # Under the rate limit, so that every request is limited even when it shares the response of another one
+    config.add_tween('honeygen_pyramid.coalescing.coalescing_tween_factory',
+                     under='honeygen_pyramid.ratelimit.rate_limit_tween_factory')
     _add_views(config)
     config.scan()
     return config.make_wsgi_app()
@@ -28,10 +37,24 @@ def _add_views(config):
     for model_class, model_info in all_models.items():
         (item_context, item_view) = model_info['item_view']
         (collection_context, collection_view) = model_info['collection_view']
-        config.add_view(item_view, context=item_context, request_method='GET', attr='read', renderer='json')
-        config.add_view(item_view, context=item_context, request_method='PATCH', attr='update', renderer='json')
-        config.add_view(item_view, context=item_context, request_method='DELETE', attr='delete', renderer='json')
-        config.add_view(collection_view, context=collection_context, request_method='POST', attr='add', renderer='json')
-        config.add_view(collection_view, context=collection_context, request_method='GET', attr='list', renderer='json')
+        config.add_view(item_view, context=item_context, request_method='GET', attr='read',
+                        permission='read', renderer='json')
+        config.add_view(item_view, context=item_context, request_method='PATCH', attr='update',
+                        permission='update', renderer='json')
+        config.add_view(item_view, context=item_context, request_method='DELETE', attr='delete',
+                        permission='delete', renderer='json')
+        config.add_view(collection_view, context=collection_context, request_method='POST', attr='add',
+                        permission='add', renderer='json')
+        config.add_view(collection_view, context=collection_context, request_method='GET', attr='list',
+                        permission='list', renderer='json')
         config.add_view(collection_view, context=collection_context, request_method='DELETE', attr='empty',
-                        renderer='json')
+                        permission='empty', renderer='json')
+        config.add_view(collection_view, context=collection_context, request_method='GET', name='aggregate',
+                        attr='aggregate', permission='list', renderer='json')
+        config.add_view(collection_view, context=collection_context, request_method='GET', name='export',
+                        attr='export', permission='list')
+        config.add_view(collection_view, context=collection_context, request_method='POST', name='import',
+                        attr='import_', permission='add', renderer='json')
+        if model_class.hg_track_changes():
+            config.add_view(collection_view, context=collection_context, request_method='GET', name='changes',
+                            attr='changes', permission='list', renderer='json')
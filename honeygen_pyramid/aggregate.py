@@ -0,0 +1,184 @@
+"""
+Aggregates computed by the database, for example /users/aggregate?count=*&avg=age&group_by=best_friend_id
+
+Each aggregate function is a parameter whose value is a comma-separated list of columns (or "*" for count),
+and the optional "group_by" parameter is a comma-separated list of columns too. The columns are
+validated against the columns of the model that are visible through the API (the columns whose name starts
+with an underscore are not), and the whole request runs as a single SELECT ... GROUP BY.
+
+Results are cached by query string. An entry expires after a delay, and the entries of a model are dropped
+as soon as a transaction that changed the model is committed.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+from collections import OrderedDict
+import decimal
+import threading
+import time
+
+from pyramid_sqlalchemy import Session
+from sqlalchemy import event, func, select
+
+FUNCTIONS = OrderedDict([
+    ('count', func.count),
+    ('sum', func.sum),
+    ('avg', func.avg),
+    ('min', func.min),
+    ('max', func.max),
+])
+
+PARAMETERS = ('group_by',) + tuple(FUNCTIONS)
+
+"""
+The number of results kept in the cache
+"""
+CACHE_SIZE = 1024
+
+
+class AggregateError(ValueError):
+    """
+    Raised when the parameters of an aggregate are invalid
+    """
+
+
+def build_statement(columns, params):
+    """
+    Build the statement computing aggregates
+    :param columns: the SQLAlchemy columns of the model
+    :param params: the query string parameters
+    :return: the statement, and the name of the columns of its result
+    """
+    columns = {column.key: column for column in columns}
+
+    def get_column(name):
+        try:
+            return columns[name]
+        except KeyError:
+            raise AggregateError('Unknown column "{}"'.format(name))
+
+    def split(value):
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    names, expressions, group_by = [], [], []
+    for name in split(params.get('group_by', '')):
+        group_by.append(get_column(name))
+        names.append(name)
+        expressions.append(columns[name])
+    for function_name, function in FUNCTIONS.items():
+        for name in split(params.get(function_name, '')):
+            if name == '*' and function_name == 'count':
+                names.append('count')
+                expressions.append(func.count())
+            else:
+                names.append('{}_{}'.format(function_name, name))
+                expressions.append(function(get_column(name)))
+    if len(expressions) == len(group_by):
+        raise AggregateError('At least one of these parameters is needed: {}'.format(', '.join(FUNCTIONS)))
+
+    statement = select(expressions)
+    if group_by:
+        statement = statement.group_by(*group_by).order_by(*group_by)
+    return statement, names
+
+
+def to_json(value):
+    """
+    Make a computed value JSON serializable: sums and averages of numeric columns are decimals
+    """
+    return float(value) if isinstance(value, decimal.Decimal) else value
+
+
+def cache_key(model, params, criterion=None):
+    """
+    Get the key of an aggregate in the cache
+    :param model: the model class
+    :param params: the query string parameters
+    :param criterion: the row-level filter of the user (see `BaseModel.hg_owner_filter`), or None
+    :return: the key, whose first item is the name of the model
+    """
+    if criterion is not None:
+        compiled = criterion.compile()
+        criterion = (str(compiled), tuple(sorted(compiled.params.items())))
+    return model.hg_name(), tuple((name, params[name]) for name in PARAMETERS if name in params), criterion
+
+
+class AggregateCache(object):
+    """
+    A thread-safe LRU cache of aggregates, whose entries expire
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, model):
+        """
+        Drop the entries of a model. The first item of the key of an entry must be the name of its model
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == model]:
+                del self.entries[key]
+
+
+cache = AggregateCache()
+
+
+def changed_models(session):
+    """
+    Get the name of the models changed by the current transaction of a session
+    """
+    return session.info.setdefault('hg_changed_models', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_models(session, flush_context):
+    changed = changed_models(session)
+    for entity in list(session.new) + list(session.dirty) + list(session.deleted):
+        hg_name = getattr(entity, 'hg_name', None)
+        if hg_name is not None:
+            changed.add(hg_name())
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+@event.listens_for(Session, 'after_bulk_update')
+def _collect_bulk_models(context):
+    changed_models(context.session).add(context.mapper.class_.hg_name())
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_models(session):
+    for model in session.info.pop('hg_changed_models', ()):
+        cache.invalidate(model)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_models(session):
+    session.info.pop('hg_changed_models', None)
+
+
+def mark_model_changed(model):
+    """
+    Mark a model as changed by the current transaction, for the changes the session events do not see
+    (such as bulk inserts)
+    :param model: the model class
+    """
+    changed_models(Session()).add(model.hg_name())
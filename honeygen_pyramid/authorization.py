@@ -0,0 +1,95 @@
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.interfaces import IAuthorizationPolicy
+from pyramid.security import Allow, Everyone, ALL_PERMISSIONS
+from zope.interface import implementer
+
+"""
+The actions of the generated views, which are also the permissions the views require
+"""
+ACTIONS = ('read', 'update', 'delete', 'add', 'list', 'empty')
+
+"""
+The ACL of the models that do not declare one
+"""
+ALLOW_ALL = [(Allow, Everyone, ALL_PERMISSIONS)]
+
+
+class CompiledACL(object):
+    """
+    A Pyramid ACL compiled into a lookup table: for each permission, the ordered
+    (principal, allowed) pairs of the ACEs that apply to it.
+    The first pair whose principal is one of the request's principals decides, like with a
+    regular ACL, but without going through all the ACEs and their permissions each time.
+    """
+    __slots__ = ('acl', '_table', '_default')
+
+    def __init__(self, acl):
+        """
+        :param acl: a Pyramid ACL: a list of (Allow|Deny, principal, permission(s)) tuples,
+        where the permissions are actions such as 'read' or 'list'
+        """
+        self.acl = acl
+        permissions = set(ACTIONS)
+        for _, _, ace_permissions in acl:
+            if ace_permissions is not ALL_PERMISSIONS:
+                permissions.update(self._as_tuple(ace_permissions))
+        self._table = {permission: self._compile(acl, permission) for permission in permissions}
+        self._default = self._compile(acl, None)
+
+    @classmethod
+    def _compile(cls, acl, permission):
+        return tuple((principal, action == Allow) for action, principal, ace_permissions in acl
+                     if ace_permissions is ALL_PERMISSIONS or permission in cls._as_tuple(ace_permissions))
+
+    @staticmethod
+    def _as_tuple(permissions):
+        return (permissions,) if isinstance(permissions, str) else tuple(permissions)
+
+    def permits(self, principals, permission):
+        """
+        Check whether principals have a permission
+        :param principals: the principals
+        :param permission: the permission
+        :return: True if the permission is allowed, False otherwise
+        """
+        for principal, allowed in self._table.get(permission, self._default):
+            if principal in principals:
+                return allowed
+        return False
+
+    def principals_allowed_by_permission(self, permission):
+        allowed = set()
+        seen = set()
+        for principal, is_allowed in self._table.get(permission, self._default):
+            if principal in seen:
+                continue
+            seen.add(principal)
+            if is_allowed:
+                allowed.add(principal)
+            elif principal == Everyone:
+                break
+        return allowed
+
+
+@implementer(IAuthorizationPolicy)
+class CompiledACLAuthorizationPolicy(object):
+    """
+    An authorization policy that uses the ACLs compiled for the models' resources
+    (see `BaseModel.hg_acl`), and falls back to the Pyramid's ACL authorization policy for the
+    other resources.
+    """
+
+    def __init__(self):
+        self.fallback = ACLAuthorizationPolicy()
+
+    def permits(self, context, principals, permission):
+        compiled_acl = getattr(context, '__hg_acl__', None)
+        if compiled_acl is None:
+            return self.fallback.permits(context, principals, permission)
+        return compiled_acl.permits(principals, permission)
+
+    def principals_allowed_by_permission(self, context, permission):
+        compiled_acl = getattr(context, '__hg_acl__', None)
+        if compiled_acl is None:
+            return self.fallback.principals_allowed_by_permission(context, permission)
+        return compiled_acl.principals_allowed_by_permission(permission)
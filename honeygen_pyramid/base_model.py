@@ -1,14 +1,27 @@
 from __future__ import absolute_import, print_function, unicode_literals
 from abc import abstractmethod
+from collections import defaultdict
 
+from pyramid.httpexceptions import HTTPForbidden
 from pyramid_sqlalchemy import metadata, Session
+from sqlalchemy import func, inspect, select
 from sqlalchemy.ext.declarative import declarative_base
 import inflect
+from zope.sqlalchemy import mark_changed
 
+from honeygen_pyramid import aggregate, changes
+from honeygen_pyramid.authorization import ALLOW_ALL, CompiledACL
 from honeygen_pyramid.base_view import ItemView, CollectionView
-from honeygen_pyramid.errors import NotFoundException
+from honeygen_pyramid.errors import NotFoundException, MultipleNotFoundException
+from honeygen_pyramid.introspector import SQLAlchemyModel, SQLAlchemyRowModel
 from honeygen_pyramid.serializer import JSONAPISerializer
 
+"""
+The number of identifiers looked up by a single query, so that the number of bound parameters stays under
+the limit of the databases (999 with SQLite before 3.32)
+"""
+IDS_PER_QUERY = 500
+
 
 class BaseModel(object):
     """
@@ -48,26 +61,254 @@ class BaseModel(object):
         return cls.hg_pluralized_name()
 
     @classmethod
-    def hg_get_by_id(cls, id):
+    def hg_acl(cls):
+        """
+        Get the access control list of the model.
+        It is a Pyramid ACL whose permissions are the actions of the views: 'read', 'update' and 'delete'
+        for the items, 'add', 'list' and 'empty' for the collection. For example:
+
+        ```
+        @classmethod
+        def hg_acl(cls):
+            return [(Allow, Authenticated, ('read', 'list')), (Allow, 'g:admin', ALL_PERMISSIONS), DENY_ALL]
+        ```
+
+        The ACL is compiled once, when the model is exposed. By default, everything is allowed.
+        Can be overridden
+        :return: the ACL, or None
+        """
+        return None
+
+    @classmethod
+    def hg_track_changes(cls):
+        """
+        Whether the inserts, updates and deletes of the entities of the class are recorded,
+        so clients can fetch them from the collection's change feed (for example /users/changes).
+        The feed is only available to the users for whom `hg_owner_filter` returns None.
+        By default, changes are not tracked.
+        Can be overridden
+        :return: True if the changes are tracked, False otherwise
+        """
+        return False
+
+    @classmethod
+    def hg_coalesce_reads(cls):
+        """
+        Whether identical reads of the model made at the same time (same URL, same principals) are handled once,
+        and share their response (see `honeygen_pyramid.coalescing`).
+        By default, reads are not coalesced.
+        Can be overridden
+        :return: True if the reads are coalesced, False otherwise
+        """
+        return False
+
+    @classmethod
+    def hg_owner_filter(cls, user):
+        """
+        Get a row-level filter that restricts the entities a user can access, for example:
+
+        ```
+        @classmethod
+        def hg_owner_filter(cls, user):
+            return cls.owner_id == user['id'] if user else false()
+        ```
+
+        The filter is added to the queries, so entities that are not accessible are never loaded.
+        By default, there is no filter.
+        Can be overridden
+        :param user: the authenticated user, or None
+        :return: a SQLAlchemy criterion, or None
+        """
+        return None
+
+    @classmethod
+    def hg_query(cls, user=None):
+        """
+        Get a query on the entities of the class that a user can access
+        :param user: the authenticated user, or None
+        :return: the query
+        """
+        query = Session.query(cls)
+        criterion = cls.hg_owner_filter(user)
+        if criterion is not None:
+            query = query.filter(criterion)
+        return query
+
+    @classmethod
+    def hg_get_by_id(cls, id, user=None):
         """
         This method get the entity represented by the class who has a certain identifier
         :param id: the identifier
+        :param user: the authenticated user, or None
         :return: the entity
         """
-        entity = Session.query(cls).get(id)
+        criterion = cls.hg_owner_filter(user)
+        if criterion is None:
+            entity = Session.query(cls).get(id)
+        else:
+            primary_key = inspect(cls).primary_key[0]
+            key = cls._hg_convert_id(primary_key, id)
+            entity = None if key is None else Session.query(cls).filter(criterion, primary_key == key).first()
         if entity is None:
             raise NotFoundException(cls, id)
         return entity
 
     @classmethod
-    def hg_get_all(cls):
+    def hg_get_by_ids(cls, ids, user=None):
+        """
+        This method get the entities represented by the class who have certain identifiers.
+        The entities already in the session are reused, and the others are loaded with a query per IDS_PER_QUERY
+        identifiers.
+        :param ids: the identifiers
+        :param user: the authenticated user, or None
+        :return: the entities, in the same order as the identifiers
+        """
+        mapper = inspect(cls)
+        primary_key = mapper.primary_key[0]
+        # The entities of the session cannot be reused if they have to be filtered
+        use_identity_map = cls.hg_owner_filter(user) is None
+        entities = {}
+        missing = []
+        for id in ids:
+            key = cls._hg_convert_id(primary_key, id)
+            entity = None
+            if key is not None and use_identity_map:
+                entity = Session.identity_map.get(mapper.identity_key_from_primary_key((key,)))
+            if entity is not None:
+                entities[id] = entity
+            elif key is not None:
+                missing.append((id, key))
+
+        if missing:
+            # Different identifiers can have the same key, for example "1" and "01"
+            keys = defaultdict(list)
+            for id, key in missing:
+                keys[key].append(id)
+            keys_list = list(keys)
+            for start in range(0, len(keys_list), IDS_PER_QUERY):
+                chunk = keys_list[start:start + IDS_PER_QUERY]
+                for entity in cls.hg_query(user).filter(primary_key.in_(chunk)):
+                    for id in keys[getattr(entity, primary_key.key)]:
+                        entities[id] = entity
+
+        not_found = [id for id in ids if id not in entities]
+        if not_found:
+            raise MultipleNotFoundException(cls, not_found)
+        return [entities[id] for id in ids]
+
+    @staticmethod
+    def _hg_convert_id(column, id):
+        """
+        Convert an identifier coming from an URL to the type of the primary key
+        :return: the converted identifier, or None if it cannot be converted
+        """
+        try:
+            return column.type.python_type(id)
+        except NotImplementedError:
+            return id
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def hg_get_all(cls, user=None):
         """
         This method get a list of all the entities of the class
+        :param user: the authenticated user, or None
         :return: the list of entities
         """
-        list = Session.query(cls).all()
+        list = cls.hg_query(user).all()
         return list
 
+    @classmethod
+    def hg_get_all_rows(cls, user=None):
+        """
+        This method get all the entities of the class as rows, without loading them into the session.
+        Only the columns needed to serialize the entities are selected (see `SQLAlchemyRowModel.select`).
+        :param user: the authenticated user, or None
+        :return: an iterable of rows
+        """
+        return Session.execute(cls.hg_select(SQLAlchemyRowModel.select(cls), user))
+
+    @classmethod
+    def hg_count(cls, user=None):
+        """
+        This method count the entities of the class, in the database
+        :param user: the authenticated user, or None
+        :return: the number of entities
+        """
+        statement = select([func.count()]).select_from(inspect(cls).local_table)
+        return Session.execute(cls.hg_select(statement, user)).scalar()
+
+    @classmethod
+    def hg_aggregate(cls, params, user=None):
+        """
+        This method compute aggregates of the entities of the class with a single query
+        (see `honeygen_pyramid.aggregate`), for example count=*&avg=age&group_by=best_friend_id
+        :param params: the aggregates to compute
+        :param user: the authenticated user, or None
+        :return: a list of dicts, one per group
+        """
+        statement, names = aggregate.build_statement(SQLAlchemyModel.get_public_columns(cls), params)
+        statement = cls.hg_select(statement.select_from(inspect(cls).local_table), user)
+        return [dict(zip(names, map(aggregate.to_json, row))) for row in Session.execute(statement)]
+
+    @classmethod
+    def hg_select(cls, statement, user=None):
+        """
+        Restrict a Core select statement on the table of the class to the rows a user can access
+        :param statement: the select statement
+        :param user: the authenticated user, or None
+        :return: the restricted statement
+        """
+        criterion = cls.hg_owner_filter(user)
+        if criterion is not None:
+            statement = statement.where(criterion)
+        return statement
+
+    @classmethod
+    def hg_bulk_insert(cls, rows, user=None):
+        """
+        This method insert many entities of the class at once, without adding the entities to the session.
+        Each row is checked by the `validate` method of an entity built from it, which raises a ValidationException
+        if it is not valid. The changes are recorded if the class tracks them.
+        If the class has an owner filter (see `hg_owner_filter`), the rows must all be accessible to the user,
+        otherwise HTTPForbidden is raised and the transaction must be aborted.
+        :param rows: a list of dicts giving the value of each column
+        :param user: the authenticated user, or None
+        """
+        if not rows:
+            return
+        for row in rows:
+            cls(**row).validate()
+        track_changes = cls.hg_track_changes()
+        criterion = cls.hg_owner_filter(user)
+        primary_key = inspect(cls).primary_key[0]
+        # The identifiers are needed to record the changes and to check the owner filter. Fetching them makes
+        # the rows be inserted one by one, so it is only done when some rows do not have one
+        needs_ids = track_changes or criterion is not None
+        return_defaults = needs_ids and any(row.get(primary_key.key) is None for row in rows)
+        Session.bulk_insert_mappings(cls, rows, return_defaults=return_defaults)
+        if criterion is not None:
+            # The filter is checked by the database, so that it works with any criterion
+            ids = [row[primary_key.key] for row in rows]
+            statement = select([func.count()]).select_from(inspect(cls).local_table)
+            accessible = Session.execute(statement.where(primary_key.in_(ids)).where(criterion)).scalar()
+            if accessible != len(ids):
+                raise HTTPForbidden('Cannot add {} entities that are not accessible'.format(cls.hg_name()))
+        if track_changes:
+            changes.record(Session(),
+                           [(cls.hg_name(), row[primary_key.key], changes.INSERT) for row in rows])
+        mark_changed(Session())  # Bulk operations are not seen by the transaction manager
+        aggregate.mark_model_changed(cls)  # Nor by the session events
+
+    @classmethod
+    def hg_delete_all(cls, user=None):
+        """
+        This method delete all the entities of the class, with a single query
+        :param user: the authenticated user, or None
+        """
+        cls.hg_query(user).delete(synchronize_session=False)
+
     def hg_save(self):
         self.validate()
         Session.flush()
@@ -85,16 +326,25 @@ class BaseModel(object):
         :return: the ResourceCollection
         """
 
+        acl = cls.hg_acl()
+        compiled_acl = CompiledACL(ALLOW_ALL if acl is None else acl)
+
         def resource_item(cls):
             subclass_name = cls.__name__ + 'ResourceItem'
-            subclass_properties = {'model': cls}
+            subclass_properties = {'model': cls,
+                                   '__acl__': compiled_acl.acl,
+                                   '__hg_acl__': compiled_acl}
             resource_item = type(subclass_name, (ResourceItem,), subclass_properties)
             return resource_item
 
         def resource_collection(cls, resource_item):
             subclass_name = cls.__name__ + 'ResourceCollection'
             subclass_properties = {'item_resource': resource_item,
-                                   'model': cls}
+                                   'model': cls,
+                                   'view_names': frozenset(['aggregate', 'export', 'import'] +
+                                                           (['changes'] if cls.hg_track_changes() else [])),
+                                   '__acl__': compiled_acl.acl,
+                                   '__hg_acl__': compiled_acl}
             resource_collection = type(subclass_name, (ResourceCollection,), subclass_properties)
             return resource_collection
 
@@ -128,13 +378,25 @@ class BaseModel(object):
 
     @classmethod
     def hg_get_serializer(cls):
-        subclass_name = cls.__name__ + 'JSONAPISerializer'
-        subclass_properties = {'hidden': []}
-        serializer = type(subclass_name, (JSONAPISerializer,), subclass_properties)
+        """
+        Get the serializer class of the model.
+        It is created once per model, and reused by all the requests.
+        :return: the serializer class
+        """
+        serializer = cls.__dict__.get('_hg_serializer')
+        if serializer is None:
+            subclass_name = cls.__name__ + 'JSONAPISerializer'
+            subclass_properties = {'hidden': []}
+            serializer = type(subclass_name, (JSONAPISerializer,), subclass_properties)
+            cls._hg_serializer = serializer
         return serializer
 
     @abstractmethod
     def validate(self):
+        """
+        Check the entity before it is saved or imported.
+        Raise a ValidationException, which is returned to the client as a 400, when it is not valid
+        """
         pass
 
 
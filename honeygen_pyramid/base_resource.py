@@ -1,4 +1,6 @@
 from __future__ import absolute_import, print_function, unicode_literals
+from pyramid.decorator import reify
+
 from honeygen_pyramid.exposed import all_models
 
 
@@ -15,15 +17,19 @@ class ResourceItem(object):
     """
     model = None
 
-    def __init__(self, id):
+    def __init__(self, parent, id):
         """
         Create the resource, and binds the corresponding entity
         to it. For example, if we access the URL '/users/5', or '/users/5/friends',
         this resource will contain the fifth user.
 
+        :param parent: the collection resource
         :param id: the identifier of the user in the collection
         """
-        self.entity = self.model.hg_get_by_id(id)
+        self.__parent__ = parent
+        self.__name__ = id
+        self.request = parent.request
+        self.entity = self.model.hg_get_by_id(id, self.request.user)
 
 
 class ResourceCollection(object):
@@ -42,9 +48,27 @@ class ResourceCollection(object):
     The class of the model represented by the resource
     """
     model = None
+    """
+    The names of the views of the collection that are not items, for example "changes" for "/users/changes"
+    """
+    view_names = frozenset()
 
-    def __init__(self):
-        self.list = self.model.hg_get_all()
+    def __init__(self, parent, name):
+        """
+        :param parent: the root resource
+        :param name: the name of the collection in the URL
+        """
+        self.__parent__ = parent
+        self.__name__ = name
+        self.request = parent.request
+
+    @reify
+    def list(self):
+        """
+        The entities of the collection.
+        They are only loaded when a view needs them, not when traversing the collection.
+        """
+        return self.model.hg_get_all(self.request.user)
 
     def __getitem__(self, item):
         """
@@ -52,7 +76,9 @@ class ResourceCollection(object):
         :param item: the identifier of the item in the collection
         :return a ResourceItem instantiated with the identifier
         """
-        resource = self.item_resource(item)
+        if item in self.view_names:
+            raise KeyError(item)  # Pyramid then uses the name to find the view
+        resource = self.item_resource(self, item)
         return resource
 
 
@@ -61,6 +87,9 @@ class Root(dict):
     The root used for traversal resource finding
     """
 
+    __name__ = ''
+    __parent__ = None
+
     def __init__(self, request, **kwargs):
         super().__init__(**kwargs)
         self.request = request
@@ -74,4 +103,4 @@ class Root(dict):
         """
         for model_class, model_info in all_models.items():
             name = model_info['url']  # If the model is "User", we want the URL to be "users"
-            self[name] = model_info['resource_collection']()
+            self[name] = model_info['resource_collection'](self, name)
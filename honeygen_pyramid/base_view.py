@@ -1,9 +1,19 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
+from pyramid.httpexceptions import HTTPBadRequest, HTTPForbidden
 from pyramid.response import Response
 from pyramid_sqlalchemy import Session
+from sqlalchemy import select
+from sqlalchemy.exc import DataError, IntegrityError
 
-from honeygen_pyramid.introspector import SQLAlchemyModel
+from honeygen_pyramid import aggregate, bulk, changes, slowlog
+from honeygen_pyramid.introspector import SQLAlchemyModel, SQLAlchemyRowModel
+from honeygen_pyramid.serializer import pluralize
+
+"""
+The maximum number of changes returned by the change feed at once
+"""
+CHANGES_PAGE_SIZE = 1000
 
 
 class BaseView(object):
@@ -67,18 +77,139 @@ class CollectionView(BaseView):
 
     def list(self):
         """
-        List items in the collection
+        List items in the collection.
+        Only some items can be listed by passing their identifiers, for example /users?filter[id]=1,2,3
+        Counting the items can be expensive, so their total is only in the meta when asked, with /users?meta=total
         :return: a list of items
         """
         entity_class = self.context.model
-        list = [SQLAlchemyModel(model) for model in self.context.list]  # TODO: remove SQLAlchemy dependency here
         serializer = entity_class.hg_get_serializer()()
-        return serializer.serialize_list(list)
+        ids = self.request.params.get('filter[id]')
+        total = None
+        if ids is not None:
+            entities = entity_class.hg_get_by_ids([id for id in ids.split(',') if id], self.request.user)
+            total = len(entities)
+            list = (SQLAlchemyModel(entity) for entity in entities)
+        elif serializer.get_computed_attributes():
+            # Computed attributes may need the entities themselves
+            list = (SQLAlchemyModel(model) for model in self.context.list)  # TODO: remove SQLAlchemy dependency here
+        else:
+            list = SQLAlchemyRowModel.from_rows(entity_class, entity_class.hg_get_all_rows(self.request.user))
+        result = serializer.serialize_list(list)
+        if 'total' in self.request.params.get('meta', '').split(','):
+            result['meta'] = {'total': total if total is not None else entity_class.hg_count(self.request.user)}
+        return result
+
+    def aggregate(self):
+        """
+        Compute aggregates of the collection in the database, for example
+        /users/aggregate?count=*&avg=age&group_by=best_friend_id.
+        The functions are count, sum, avg, min and max, and each one takes a comma-separated list of columns.
+        Results are cached by query string (see `honeygen_pyramid.aggregate`) for the number of seconds
+        of the "aggregate.cache_ttl" setting.
+        :return: one item per group, with the value of the grouped columns and of the aggregates
+        """
+        entity_class = self.context.model
+        params = self.request.params
+        ttl = float(self.request.registry.settings.get('aggregate.cache_ttl', 60))
+        # The results seen by a transaction that changed the collection may never be committed
+        use_cache = ttl > 0 and entity_class.hg_name() not in aggregate.changed_models(Session())
+        key = aggregate.cache_key(entity_class, params, entity_class.hg_owner_filter(self.request.user))
+        result = aggregate.cache.get(key) if use_cache else None
+        if result is None:
+            try:
+                result = entity_class.hg_aggregate(params, self.request.user)
+            except aggregate.AggregateError as e:
+                raise HTTPBadRequest(str(e))
+            if use_cache:
+                aggregate.cache.set(key, result, ttl)
+        return {'data': result}
+
+    def changes(self):
+        """
+        List the changes made to the collection after a cursor, for example /users/changes?since=42.
+        The cursor to use for the next call is in the meta of the response. If it is too old, the changes are
+        not available anymore: "reset" is then true in the meta, and the whole collection must be reloaded.
+        The feed is refused to the users whose access is restricted by the owner filter of the model.
+        :return: a list of changed items
+        """
+        entity_class = self.context.model
+        if entity_class.hg_owner_filter(self.request.user) is not None:
+            # The log cannot tell which of the changed entities, some of them deleted, the user can access
+            raise HTTPForbidden('The changes of {} are only available to the users who can access all of them'
+                                .format(entity_class.hg_url()))
+        try:
+            since = int(self.request.params.get('since', 0))
+            limit = min(int(self.request.params.get('limit', CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE)
+        except ValueError:
+            raise HTTPBadRequest('"since" and "limit" must be integers')
+        if limit < 1:
+            raise HTTPBadRequest('"limit" must be at least 1')
+        entries, reset = changes.get_changes(entity_class.hg_name(), since, limit)
+        type = pluralize(entity_class.hg_name())
+        return {
+            'data': [{'type': type, 'id': entity_id, 'meta': {'operation': operation}}
+                     for _, entity_id, operation in entries],
+            'meta': {
+                'cursor': entries[-1][0] if entries else max(since, changes.get_cursor(entity_class.hg_name())),
+                'reset': reset,
+                'more': len(entries) == limit,
+            },
+        }
+
+    def export(self):
+        """
+        Export the whole collection, for example /users/export?format=csv.
+        The rows are streamed with a server-side cursor, so the memory used does not depend on their number.
+        The format is either "ndjson" (by default) or "csv". Only the columns visible through the API are exported:
+        the columns whose name starts with an underscore are not.
+        :return: a streamed response
+        """
+        entity_class = self.context.model
+        format = self._bulk_format()
+        columns = SQLAlchemyModel.get_public_columns(entity_class)
+        statement = entity_class.hg_select(select(columns), self.request.user)
+        # The rows are read after the view returns, outside of the request's context
+        statement = statement.execution_options(**{slowlog.REQUEST_OPTION: self.request})
+        response = Response(content_type=bulk.FORMATS[format], charset='utf-8')
+        response.content_disposition = 'attachment; filename="{}.{}"'.format(entity_class.hg_url(), format)
+        response.app_iter = bulk.stream_rows(Session.get_bind(), statement, format)
+        return response
+
+    def import_(self):
+        """
+        Import rows into the collection, for example POST /users/import?format=csv with the file as body.
+        The file is parsed incrementally and inserted by batches, in the transaction of the request.
+        The format is either "ndjson" (by default) or "csv", and is the same as the export's: the rows can only
+        have the columns that are exported, and are validated like the added items.
+        Like the other actions, the import is restricted by the owner filter of the model: if a row would not be
+        accessible to the user, nothing is imported.
+        :return: the number of imported rows
+        """
+        entity_class = self.context.model
+        format = self._bulk_format()
+        records = bulk.parse(self.request.body_file, format, SQLAlchemyModel.get_public_columns(entity_class))
+        imported = 0
+        try:
+            for rows in bulk.batched(records):
+                entity_class.hg_bulk_insert(rows, self.request.user)
+                imported += len(rows)
+        except bulk.BulkFormatError as e:
+            raise HTTPBadRequest(str(e))
+        except (DataError, IntegrityError) as e:  # For example an identifier that already exists
+            raise HTTPBadRequest('Cannot import the rows: {}'.format(e.orig))
+        return {'meta': {'imported': imported}}
+
+    def _bulk_format(self):
+        format = self.request.GET.get('format', 'ndjson')  # The body is not a form, it must not be parsed
+        if format not in bulk.FORMATS:
+            raise HTTPBadRequest('The format must be one of: {}'.format(', '.join(sorted(bulk.FORMATS))))
+        return format
 
     def empty(self):
         """
         Empty the collection (delete all items)
         """
         entity_class = self.context.model
-        Session.query(entity_class).delete()
+        entity_class.hg_delete_all(self.request.user)
         return Response(status=204)
@@ -0,0 +1,209 @@
+"""
+Export and import of whole collections, in NDJSON (one JSON object per line) or in CSV.
+
+Both directions work on batches of rows, so the memory used does not depend on the size of the collection:
+ - exports read the rows with a server-side cursor and stream them to the client
+ - imports parse the uploaded file incrementally and insert it batch by batch
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import codecs
+import csv
+import datetime
+import decimal
+import io
+import json
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+"""
+The number of rows read from the database, or inserted into it, at once
+"""
+BATCH_SIZE = 5000
+
+
+class BulkFormatError(ValueError):
+    """
+    Raised when an uploaded file cannot be parsed
+    """
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def export_ndjson(names, batches):
+    """
+    Generate an NDJSON document
+    :param names: the name of the columns
+    :param batches: an iterable of lists of rows
+    :return: a generator of encoded chunks, one per batch
+    """
+    encoder = json.JSONEncoder(default=_to_json)
+    for rows in batches:
+        yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in rows).encode('utf-8')
+
+
+def export_csv(names, batches):
+    """
+    Generate a CSV document, with a header row
+    :param names: the name of the columns
+    :param batches: an iterable of lists of rows
+    :return: a generator of encoded chunks, one per batch
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_rows(engine, statement, format):
+    """
+    Stream the result of a statement, on its own connection so the response can outlive the request's
+    transaction
+    :param engine: the engine to connect to
+    :param statement: the select statement
+    :param format: 'ndjson' or 'csv'
+    :return: a generator of encoded chunks
+    """
+    connection = engine.connect()
+    try:
+        result = connection.execution_options(stream_results=True).execute(statement)
+        names = list(result.keys())
+
+        def batches():
+            rows = result.fetchmany(BATCH_SIZE)
+            while rows:
+                yield rows
+                rows = result.fetchmany(BATCH_SIZE)
+
+        export = export_ndjson if format == 'ndjson' else export_csv
+        for chunk in export(names, batches()):
+            yield chunk
+    finally:
+        connection.close()
+
+
+"""
+The JSON types accepted for the values of a column, by Python type of the column
+"""
+JSON_TYPES = {
+    bool: (bool,),
+    int: (int,),
+    float: (int, float),
+    decimal.Decimal: (int, float, str),
+    str: (str,),
+    datetime.date: (str,),
+    datetime.datetime: (str,),
+    datetime.time: (str,),
+}
+
+TEXT_BOOLEANS = {'1': True, 'true': True, 'yes': True, '0': False, 'false': False, 'no': False}
+
+
+def _parse_text_boolean(value):
+    try:
+        return TEXT_BOOLEANS[value.strip().lower()]
+    except KeyError:
+        raise ValueError('{!r} is not a boolean'.format(value))
+
+
+def _converter(column, from_text):
+    """
+    Get the function converting the values of a column from a parsed file.
+    It raises TypeError or ValueError for the values that do not fit the column.
+    :param column: the SQLAlchemy column
+    :param from_text: whether the values are strings (CSV) or JSON values (NDJSON)
+    """
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+
+    if python_type in (datetime.date, datetime.datetime, datetime.time):
+        parse = python_type.fromisoformat
+    elif python_type is bool and from_text:
+        parse = _parse_text_boolean
+    elif python_type is decimal.Decimal:
+        parse = lambda value: decimal.Decimal(str(value))  # Floats are not exact
+    elif from_text:
+        parse = python_type
+    else:
+        parse = None
+    accepted = None if from_text else JSON_TYPES.get(python_type)
+    if parse is None and accepted is None:
+        return None
+
+    def convert(value):
+        if value is None or (from_text and value == ''):
+            return None
+        if accepted is not None and (not isinstance(value, accepted) or
+                                     (isinstance(value, bool) and python_type is not bool)):
+            raise TypeError('{!r} is not a valid {}'.format(value, python_type.__name__))
+        return parse(value) if parse is not None else value
+
+    return convert
+
+
+def parse(file, format, columns):
+    """
+    Parse an uploaded file incrementally
+    :param file: a binary file-like object
+    :param format: 'ndjson' or 'csv'
+    :param columns: the SQLAlchemy columns that can be imported
+    :return: a generator of dicts, one per row
+    """
+    columns = {column.key: column for column in columns}
+    text = codecs.getreader('utf-8')(file)  # Unlike io.TextIOWrapper, it works with any object that has read()
+    if format == 'csv':
+        records = csv.DictReader(text)
+    else:
+        records = (_parse_json_line(number, line) for number, line in enumerate(text, 1) if line.strip())
+
+    converters = {name: _converter(column, format == 'csv') for name, column in columns.items()}
+    for number, record in enumerate(records, 1):
+        unknown = set(record) - set(columns)
+        if unknown:
+            unknown = ', '.join(sorted(str(name) for name in unknown))
+            raise BulkFormatError('Unknown columns in record {}: {}'.format(number, unknown))
+        try:
+            yield {name: converters[name](value) if converters[name] else value for name, value in record.items()}
+        except (TypeError, ValueError, decimal.InvalidOperation) as e:
+            raise BulkFormatError('Invalid value in record {}: {}'.format(number, e))
+
+
+def _parse_json_line(number, line):
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise BulkFormatError('Invalid JSON on line {}: {}'.format(number, e))
+    if not isinstance(record, dict):
+        raise BulkFormatError('Line {} is not a JSON object'.format(number))
+    return record
+
+
+def batched(records, size=None):
+    """
+    Group records into lists of at most `size` records, by default BATCH_SIZE
+    """
+    size = size or BATCH_SIZE
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
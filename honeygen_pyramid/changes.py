@@ -0,0 +1,193 @@
+"""
+Change tracking for the exposed models.
+
+The inserts, updates and deletes of the models whose `hg_track_changes` returns True are
+recorded, through the session events, into an append-only log table. The identifier of an
+entry is a cursor: a client mirroring a collection only has to ask for the changes made after
+the last cursor it has seen (for example /users/changes?since=42).
+
+The cursors must be visible in the order in which they are assigned, otherwise a client could see a cursor,
+then miss a smaller one committed after it. So the changes of a transaction are only appended to the log
+when it is committed, while it holds the lock of the log, until the end of the commit.
+
+Bulk deletes (see `BaseModel.hg_delete_all`) cannot tell which entities they delete, so they
+are recorded as a single "empty" change, after which the client has to reload the collection.
+
+To stay bounded, the log of a model is regularly compacted:
+ - only the last change of each entity is kept, which is enough for a client to be up to date
+ - only the last RETENTION changes are kept. The oldest kept entry is then marked as "compacted",
+   so that clients whose cursor is older know they have missed changes and must reload everything.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+from collections import defaultdict
+
+from pyramid_sqlalchemy import metadata, Session
+from sqlalchemy import DDL, Column, Integer, Table, Text, and_, event, func, select
+
+"""
+The number of changes kept for each model
+"""
+RETENTION = 10000
+
+"""
+The number of changes recorded for a model between two compactions of its log
+"""
+COMPACTION_INTERVAL = 1000
+
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+EMPTY = 'empty'
+COMPACTED = 'compacted'
+
+changes = Table(
+    'hg_changes', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('model', Text, nullable=False, index=True),
+    Column('entity_id', Integer),
+    Column('operation', Text, nullable=False),
+)
+
+"""
+A table with a single row, updated by the transactions before they append their changes to the log, so they
+hold its lock until they are committed and append their changes one after the other
+"""
+lock = Table(
+    'hg_changes_lock', metadata,
+    Column('id', Integer, primary_key=True),
+)
+event.listen(lock, 'after_create', DDL('INSERT INTO hg_changes_lock (id) VALUES (1)'))
+
+"""
+The number of changes recorded for each model since the last compaction of its log, in this process
+"""
+_recorded = defaultdict(int)
+
+
+def _is_tracked(cls):
+    track_changes = getattr(cls, 'hg_track_changes', None)
+    return track_changes is not None and track_changes()
+
+
+def recorded_changes(session):
+    """
+    Get the changes recorded by the current transaction of a session, which are appended to the log
+    when it is committed
+    :return: a list of (model name, entity identifier, operation) tuples
+    """
+    return session.info.setdefault('hg_recorded_changes', [])
+
+
+def record(session, entries):
+    """
+    Record changes made by the current transaction of a session
+    :param session: the session
+    :param entries: a list of (model name, entity identifier, operation) tuples
+    """
+    recorded_changes(session).extend(entries)
+
+
+def append(connection, entries):
+    """
+    Append changes to the log, and compact the log of the models that need it.
+    The transaction of the connection must be committed right after, since it holds the lock of the log.
+    :param connection: the connection to use
+    :param entries: a list of (model name, entity identifier, operation) tuples
+    """
+    if not entries:
+        return
+    # The lock is held until the end of the transaction: the cursors of the other transactions will be greater,
+    # and will be committed after these ones
+    connection.execute(lock.update().values(id=lock.c.id))
+    connection.execute(changes.insert(), [{'model': model, 'entity_id': entity_id, 'operation': operation}
+                                          for model, entity_id, operation in entries])
+    for model, _, _ in entries:
+        _recorded[model] += 1
+    for model in {model for model, _, _ in entries}:
+        if _recorded[model] >= COMPACTION_INTERVAL:
+            compact(connection, model)
+
+
+def compact(connection, model, retention=RETENTION):
+    """
+    Compact the log of a model
+    :param connection: the connection to use
+    :param model: the name of the model
+    :param retention: the number of changes to keep
+    """
+    _recorded[model] = 0
+    is_model = changes.c.model == model
+    # Only the last change of each entity is needed
+    last_changes = select([func.max(changes.c.id)]).where(is_model).group_by(changes.c.entity_id)
+    connection.execute(changes.delete().where(and_(is_model, changes.c.operation != COMPACTED,
+                                                   changes.c.id.notin_(last_changes))))
+    cutoff = connection.execute(select([changes.c.id]).where(is_model).order_by(changes.c.id.desc())
+                                .limit(1).offset(retention)).scalar()
+    if cutoff is not None:
+        connection.execute(changes.delete().where(and_(is_model, changes.c.id < cutoff)))
+        connection.execute(changes.update().where(changes.c.id == cutoff)
+                           .values(entity_id=None, operation=COMPACTED))
+
+
+def get_changes(model, since, limit):
+    """
+    Get the changes of a model after a cursor
+    :param model: the name of the model
+    :param since: the cursor
+    :param limit: the maximum number of changes to get
+    :return: a list of (cursor, entity identifier, operation) tuples, and whether the client has missed
+    changes and must reload everything
+    """
+    is_model = changes.c.model == model
+    compacted = Session.execute(select([func.max(changes.c.id)])
+                                .where(and_(is_model, changes.c.operation == COMPACTED))).scalar()
+    if compacted is not None and since < compacted:
+        return [], True
+    entries = Session.execute(select([changes.c.id, changes.c.entity_id, changes.c.operation])
+                              .where(and_(is_model, changes.c.id > since, changes.c.operation != COMPACTED))
+                              .order_by(changes.c.id).limit(limit))
+    return [tuple(entry) for entry in entries], False
+
+
+def get_cursor(model):
+    """
+    Get the cursor of the last change of a model
+    :param model: the name of the model
+    :return: the cursor, or 0 if the model never changed
+    """
+    return Session.execute(select([func.max(changes.c.id)]).where(changes.c.model == model)).scalar() or 0
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed_changes(session, flush_context):
+    entries = []
+    for operation, entities in ((INSERT, session.new), (UPDATE, session.dirty), (DELETE, session.deleted)):
+        for entity in entities:
+            if not _is_tracked(entity.__class__):
+                continue
+            if operation == UPDATE and not session.is_modified(entity, include_collections=False):
+                continue
+            entries.append((entity.hg_name(), entity.id, operation))
+    record(session, entries)
+
+
+@event.listens_for(Session, 'after_bulk_delete')
+def _record_bulk_delete(delete_context):
+    cls = delete_context.mapper.class_
+    if _is_tracked(cls):
+        record(delete_context.session, [(cls.hg_name(), None, EMPTY)])
+
+
+@event.listens_for(Session, 'before_commit')
+def _append_recorded_changes(session):
+    if session.transaction.nested:
+        return  # Only the outermost transaction is committed
+    session.flush()  # The flush records the changes that are still pending
+    append(session.connection(), session.info.pop('hg_recorded_changes', []))
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_recorded_changes(session, transaction):
+    # The transaction manager aborts by closing the session, which is not seen by after_rollback
+    if transaction.parent is None:
+        session.info.pop('hg_recorded_changes', None)
@@ -0,0 +1,109 @@
+"""
+A tween that coalesces identical reads: when a resource is requested by many clients at the same moment
+(for example after a cache expires), only the first request is handled, and the others wait for its response.
+
+Requests are identical when they are GET requests of the same URL, made with the same principals, so a response
+is only ever shared with clients that could have got it themselves. Only the models whose `hg_coalesce_reads`
+returns True are coalesced.
+
+The tween is under the rate limit tween (see `honeygen_pyramid.ratelimit`), so a request that shares the response
+of another one is still limited. Streamed responses (such as exports), failed requests and 429 responses are not
+shared: the waiting requests are then handled on their own, as are those that waited for longer than the timeout.
+
+The tween is configured with this setting:
+ - coalescing.timeout: the number of seconds a request waits for an identical one, at most (default 30)
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import threading
+
+from pyramid.response import Response
+
+from honeygen_pyramid.exposed import all_models
+from honeygen_pyramid.ratelimit import get_action
+
+
+class Flight(object):
+    """
+    A request being handled, and the result it is waiting for
+    """
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight(object):
+    """
+    Run a function once for all the threads that call it with the same key at the same time
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, function, timeout):
+        """
+        Run a function, or wait for the thread already running it with the same key
+        :param key: the key
+        :param function: the function, which returns a result to share, or None if its result cannot be shared
+        :param timeout: the number of seconds to wait for another thread, at most
+        :return: the result, and whether this thread ran the function
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if leader:
+            try:
+                flight.result = function()
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+            return flight.result, True
+        if flight.done.wait(timeout) and flight.result is not None:
+            return flight.result, False
+        return function(), True
+
+
+def freeze(response):
+    """
+    Get what is needed to copy a response, or None if it is streamed, failed, or only meant for its own client
+    """
+    if response.status_code >= 500 or response.status_code == 429 or \
+            not isinstance(response.app_iter, (list, tuple)):
+        return None
+    return response.status, list(response.headerlist), response.body
+
+
+def coalescing_tween_factory(handler, registry):
+    timeout = float(registry.settings.get('coalescing.timeout', 30))
+    collections = {model_info['url']: model for model, model_info in all_models.items()
+                   if model.hg_coalesce_reads()}
+    if not collections:
+        return handler
+    flights = SingleFlight()
+
+    def coalescing_tween(request):
+        if request.method != 'GET':
+            return handler(request)
+        model, _ = get_action(request, collections)
+        if model is None:
+            return handler(request)
+
+        responses = []
+
+        def handle():
+            responses.append(handler(request))
+            return freeze(responses[-1])
+
+        frozen, handled = flights.do((request.path_qs, request.principals), handle, timeout)
+        if handled:
+            return responses[-1]
+        status, headerlist, body = frozen
+        return Response(status=status, headerlist=list(headerlist), body=body)
+
+    coalescing_tween.flights = flights
+    return coalescing_tween
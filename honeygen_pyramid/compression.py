@@ -0,0 +1,224 @@
+"""
+A tween that compresses the responses, with gzip or with Brotli when the `brotli` package is installed.
+
+JSON:API documents are very repetitive, so they compress well. The encoding is negotiated with
+the Accept-Encoding header of the request, and responses are only compressed when they are
+bigger than a threshold, because compressing small bodies costs more than it saves.
+
+Responses whose body is known are compressed at once, and their compressed body is cached (by URL and
+ETag, or else by a digest of the body), so repeated hits on the same resource are not compressed again.
+Streamed responses are compressed on the fly, chunk by chunk.
+
+The tween is configured with these settings:
+ - compression.min_size: the minimum size of a body to compress, in bytes (default 1024)
+ - compression.level: the gzip compression level, from 1 to 9 (default 6)
+ - compression.brotli_quality: the Brotli compression quality, from 0 to 11 (default 5). Brotli's own default,
+   11, compresses much slower than gzip for a small gain, which does not pay off for dynamic responses
+ - compression.cache_size: the number of compressed bodies to cache, 0 to disable the cache (default 256)
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+from collections import OrderedDict
+import hashlib
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/vnd.api+json', 'application/x-ndjson', 'text/')
+
+"""
+The bodies bigger than this are compressed but not cached
+"""
+MAX_CACHED_BODY_SIZE = 1024 * 1024
+
+
+class GzipEncoder(object):
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, body):
+        compressor = self.compressor()
+        return compressor.compress(body) + compressor.flush()
+
+    def compressor(self):
+        """
+        :return: an object with the `compress(chunk)` and `flush()` methods of zlib's compression objects
+        """
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16 + : gzip container
+
+
+class BrotliEncoder(object):
+    name = 'br'
+
+    def __init__(self, quality):
+        self.quality = quality
+
+    def compress(self, body):
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=self.quality)
+
+    def compressor(self):
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=self.quality)
+        return BrotliStreamCompressor(compressor)
+
+
+class BrotliStreamCompressor(object):
+    """
+    Give Brotli's streaming compressor the interface of zlib's compression objects
+    """
+
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def compress(self, chunk):
+        return self.compressor.process(chunk)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+class CompressedBodyCache(object):
+    """
+    A thread-safe LRU cache of compressed bodies
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.bodies = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.bodies.get(key)
+            if body is not None:
+                self.bodies.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        with self.lock:
+            self.bodies[key] = body
+            self.bodies.move_to_end(key)
+            while len(self.bodies) > self.size:
+                self.bodies.popitem(last=False)
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header
+    :return: a dict giving the quality of each accepted encoding
+    """
+    qualities = {}
+    for part in header.split(','):
+        encoding, _, parameters = part.strip().partition(';')
+        quality = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith('q='):
+            try:
+                quality = float(parameters[2:])
+            except ValueError:
+                quality = 0.0
+        if encoding:
+            qualities[encoding.strip().lower()] = quality
+    return qualities
+
+
+def negotiate(header, encoders):
+    """
+    Choose the encoder to use for a request
+    :param header: the Accept-Encoding header of the request
+    :param encoders: the available encoders, by order of preference
+    :return: the encoder, or None if the response should not be compressed
+    """
+    if not header:
+        return None
+    qualities = parse_accept_encoding(header)
+    best, best_quality = None, 0
+    for encoder in encoders:
+        quality = qualities.get(encoder.name, qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = encoder, quality
+    return best
+
+
+def is_compressible(request, response):
+    if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    if response.content_encoding is not None:
+        return False
+    content_type = response.content_type or ''
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressedStream(object):
+    """
+    A streamed body compressed chunk by chunk.
+    Closing it closes the original body, even if it was never iterated (a generator that has not started
+    would not run its `finally`), so the resources held by the original body are always released.
+    """
+
+    def __init__(self, app_iter, compressor):
+        self.app_iter = app_iter
+        self.compressor = compressor
+
+    def __iter__(self):
+        for chunk in self.app_iter:
+            compressed = self.compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield self.compressor.flush()
+
+    def close(self):
+        close = getattr(self.app_iter, 'close', None)
+        if close is not None:
+            close()
+
+
+def compression_tween_factory(handler, registry):
+    settings = registry.settings
+    min_size = int(settings.get('compression.min_size', 1024))
+    level = int(settings.get('compression.level', 6))
+    brotli_quality = int(settings.get('compression.brotli_quality', 5))
+    cache_size = int(settings.get('compression.cache_size', 256))
+    cache = CompressedBodyCache(cache_size) if cache_size > 0 else None
+    encoders = [GzipEncoder(level)]
+    if brotli is not None:
+        encoders.insert(0, BrotliEncoder(brotli_quality))
+
+    def compression_tween(request):
+        response = handler(request)
+        if not is_compressible(request, response):
+            return response
+        if 'Accept-Encoding' not in (response.vary or ()):
+            response.vary = tuple(response.vary or ()) + ('Accept-Encoding',)
+        encoder = negotiate(request.headers.get('Accept-Encoding'), encoders)
+        if encoder is None:
+            return response
+
+        if isinstance(response.app_iter, (list, tuple)):
+            body = response.body
+            if len(body) < min_size:
+                return response
+            compressed = None
+            if cache is not None and len(body) <= MAX_CACHED_BODY_SIZE:
+                if response.etag:
+                    key = (encoder.name, request.path_qs, response.etag)
+                else:
+                    key = (encoder.name, hashlib.sha1(body).digest())
+                compressed = cache.get(key)
+                if compressed is None:
+                    compressed = encoder.compress(body)
+                    cache.set(key, compressed)
+            if compressed is None:
+                compressed = encoder.compress(body)
+            response.body = compressed
+        else:
+            response.app_iter = CompressedStream(response.app_iter, encoder.compressor())
+            response.content_length = None
+        response.content_encoding = encoder.name
+        return response
+
+    return compression_tween
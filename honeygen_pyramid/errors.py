@@ -1,4 +1,7 @@
 from __future__ import absolute_import, print_function, unicode_literals
+import math
+
+from pyramid.httpexceptions import HTTPBadRequest, HTTPForbidden
 from pyramid.view import view_config
 
 
@@ -8,14 +11,59 @@ class NotFoundException(Exception):
         self.code = 404
 
 
+class MultipleNotFoundException(Exception):
+    """
+    Raised when several entities requested at once cannot be found.
+    Each of them is reported as its own error.
+    """
+
+    def __init__(self, cls, ids):
+        self.exceptions = [NotFoundException(cls, id) for id in ids]
+        super().__init__(' ; '.join(str(exception) for exception in self.exceptions))
+        self.code = 404
+
+
+class ValidationException(Exception):
+    """
+    Raised by `BaseModel.validate` when an entity is not valid
+    """
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.code = 400
+
+
+class TooManyRequestsException(Exception):
+    """
+    Raised when a client makes too many requests (see `honeygen_pyramid.ratelimit`)
+    """
+
+    def __init__(self, message, retry_after):
+        """
+        :param message: the detail of the error
+        :param retry_after: the number of seconds after which the client can try again
+        """
+        super().__init__(message)
+        self.code = 429
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
 @view_config(context=NotFoundException, renderer='json')
+@view_config(context=ValidationException, renderer='json')
+@view_config(context=TooManyRequestsException, renderer='json')
+@view_config(context=MultipleNotFoundException, renderer='json')
+@view_config(context=HTTPForbidden, renderer='json')
+@view_config(context=HTTPBadRequest, renderer='json')
 def exception_view(exc, request):
     request.response.status_code = exc.code
+    retry_after = getattr(exc, 'retry_after', None)
+    if retry_after is not None:
+        request.response.retry_after = retry_after
     return {
         'errors': [
             {
-                'status': str(exc.code),
-                'detail': str(exc),
-            },
+                'status': str(exception.code),
+                'detail': str(exception),
+            } for exception in getattr(exc, 'exceptions', [exc])
         ],
     }
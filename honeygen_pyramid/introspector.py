@@ -1,6 +1,9 @@
-from sqlalchemy import inspect
+from operator import attrgetter
+
+from sqlalchemy import inspect, select
 
 from sqlalchemy.orm import ColumnProperty, load_only
+from sqlalchemy.orm.interfaces import MANYTOONE
 
 
 class Relationship(object):
@@ -12,6 +15,7 @@ class Relationship(object):
      - the value (usually an ID or an array of IDs)
      - a flag that determines whether it is a *-to-one or *-to-many relationship
     """
+    __slots__ = ('name', 'value', 'type', 'to_many')
 
     def __init__(self, name, value, type, to_many=False):
         self.name = name
@@ -26,11 +30,14 @@ class Attribute(object):
     An attribute has:
      - a name (string)
      - a value
+     - a type (optional)
     """
+    __slots__ = ('name', 'value', 'type')
 
-    def __init__(self, name, value):
+    def __init__(self, name, value, type=None):
         self.name = name
         self.value = value
+        self.type = type
 
 
 class Model(object):
@@ -39,7 +46,12 @@ class Model(object):
     A model has :
      - a list of attributes
      - a list of relationships
+
+    Models are created for every row that is serialized, so they can be kept compact: created with `from_values`,
+    the attributes are stored as a tuple of names, shared by all the models of the same class, and a tuple of
+    values. `Attribute` objects are then only created when the `attributes` property is used.
     """
+    __slots__ = ('attribute_names', 'attribute_values', '_attributes', '_relationships', 'name', 'source')
 
     def __init__(self, attributes, relationships, name, source):
         """
@@ -50,85 +62,209 @@ class Model(object):
         :param source: the entity from which the model was extracted
         """
         self.attributes = attributes
-        self.relationships = relationships
+        self._relationships = relationships
+        self.source = source
+        self.name = name
+
+    @classmethod
+    def from_values(cls, attribute_names, attribute_values, relationships, name, source):
+        """
+        Create a compact model, without creating its attributes
+        :param attribute_names: a tuple with the name of each attribute
+        :param attribute_values: a tuple with the value of each attribute, in the same order as the names
+        :param relationships: a list of relationships
+        :param name: the name of the model
+        :param source: the entity from which the model was extracted
+        :return: the model
+        """
+        model = cls.__new__(cls)
+        model._set_values(attribute_names, attribute_values, relationships, name, source)
+        return model
+
+    def _set_values(self, attribute_names, attribute_values, relationships, name, source):
+        self.attribute_names = attribute_names
+        self.attribute_values = attribute_values
+        self._attributes = None
+        self._relationships = relationships
         self.source = source
         self.name = name
 
+    @property
+    def attributes(self):
+        """
+        The attributes of the model
+        :return: a list of Attribute
+        """
+        if self._attributes is not None:
+            return self._attributes
+        return [Attribute(name, value) for name, value in zip(self.attribute_names, self.attribute_values)]
+
+    @attributes.setter
+    def attributes(self, attributes):
+        self._attributes = attributes
+        self.attribute_names = tuple(attribute.name for attribute in attributes)
+        self.attribute_values = tuple(attribute.value for attribute in attributes)
+
+    @property
+    def relationships(self):
+        return self._relationships
+
+    @relationships.setter
+    def relationships(self, relationships):
+        self._relationships = relationships
+
+    @property
+    def id(self):
+        return self.source.id
+
+
+class SQLAlchemyModelDescription(object):
+    """
+    What the introspection of a SQLAlchemy model class gives: the name of its attributes
+    and a description of its relationships.
+    It is computed once per class, and shared by all the models extracted from its entities.
+    """
+    __slots__ = ('attribute_names', 'get_attribute_values', 'relationships', 'columns', 'foreign_keys')
+
+    def __init__(self, attribute_names, relationships, columns, foreign_keys):
+        """
+        :param attribute_names: a tuple with the name of each attribute
+        :param relationships: a tuple of (name, type, to_many) tuples
+        :param columns: the primary key column followed by the column of each attribute
+        :param foreign_keys: a tuple of (name, type, column) tuples, one for each *-to-one relationship
+        whose identifier is stored in a column of the model
+        """
+        self.attribute_names = attribute_names
+        self.relationships = relationships
+        self.columns = columns
+        self.foreign_keys = foreign_keys
+        if len(attribute_names) == 1:
+            self.get_attribute_values = lambda entity: (getattr(entity, attribute_names[0]),)
+        elif attribute_names:
+            self.get_attribute_values = attrgetter(*attribute_names)
+        else:
+            self.get_attribute_values = lambda entity: ()
+
 
 class SQLAlchemyModel(Model):
     """
     A SQLAlchemy model.
     Used to parse an SQLAlchemy object. Since this class is a subclass of a model, a SQLAlchemy
-    model can be used in a standard way
+    model can be used in a standard way.
+    The relationships are only extracted when they are used, because each of them may need a query.
     """
+    __slots__ = ()
+
+    _descriptions = {}
 
     def __init__(self, sqlalchemy_entity):
-        super().__init__(self.get_attributes(sqlalchemy_entity),
-                         self.get_relationships(sqlalchemy_entity),
+        description = self.describe(sqlalchemy_entity.__class__)
+        self._set_values(description.attribute_names,
+                         description.get_attribute_values(sqlalchemy_entity),
+                         None,
                          sqlalchemy_entity.hg_name(),
                          sqlalchemy_entity)
 
+    @property
+    def relationships(self):
+        if self._relationships is None:
+            self._relationships = self.get_relationships(self.source)
+        return self._relationships
+
+    @classmethod
+    def describe(cls, model):
+        """
+        Get the description of a SQLAlchemy model class, introspecting it only the first time
+        :param model: the SQLAlchemy model class
+        :return: a SQLAlchemyModelDescription
+        """
+        try:
+            return cls._descriptions[model]
+        except KeyError:
+            mapper = inspect(model)
+            columns = cls.get_sqlalchemy_attributes(model)
+            foreign_keys = tuple((relationship.key, relationship.mapper.class_.hg_name(),
+                                  next(iter(relationship.local_columns)))
+                                 for relationship in mapper.relationships.values()
+                                 if relationship.direction is MANYTOONE and len(relationship.local_columns) == 1)
+            description = SQLAlchemyModelDescription(
+                tuple(column.name for column in columns),
+                tuple((relationship.key, relationship.mapper.class_.hg_name(), relationship.uselist)
+                      for relationship in mapper.relationships.values()),
+                (mapper.primary_key[0],) + tuple(columns),
+                foreign_keys)
+            cls._descriptions[model] = description
+            return description
+
+    @staticmethod
+    def get_sqlalchemy_columns(model):
+        """
+        Get all the columns of a SQLAlchemy model, including primary and foreign keys
+        :return an array of SQLAlchemy columns
+        """
+        return [attr.columns[0] for attr in inspect(model).attrs if isinstance(attr, ColumnProperty)]
+
     @staticmethod
-    def get_attributes(entity):
+    def get_public_columns(model):
+        """
+        Get the columns of a SQLAlchemy model that are visible through the API: the primary keys, the foreign keys
+        and the attributes (see `get_sqlalchemy_attributes`)
+
+        :return an array of SQLAlchemy columns
+        """
+        columns = []
+        for attr in inspect(model).attrs:
+            if isinstance(attr, ColumnProperty):
+                col = attr.columns[0]
+                if col.primary_key or col.foreign_keys or not col.name.startswith('_'):
+                    columns.append(col)
+        return columns
+
+    @staticmethod
+    def get_sqlalchemy_attributes(model):
+        """
+        Get all attributes from a SQLAlchemy model excluding:
+         - primary keys
+         - foreign keys
+         - attributes that starts with an underscore
+
+        :return an array of SQLAlchemy columns
+        """
+        columns = []
+        for attr in inspect(model).attrs:
+            if isinstance(attr, ColumnProperty):
+                col = attr.columns[0]
+                if not col.primary_key and not col.foreign_keys and not col.name.startswith('_'):
+                    columns.append(col)
+        return columns
+
+    @classmethod
+    def get_attributes(cls, entity):
         """
         Get all attributes of a SQLAlchemy entity.
 
         The returned information about an attribute are:
          - its name (a string)
          - its value
-         - its type (a string)
-
-        In case of the attribute being extracted from an SQLAlchemy column, its type will be the result of
-        column.type.
 
         :return an array of Attribute
         """
+        description = cls.describe(entity.__class__)
+        values = description.get_attribute_values(entity)
+        return [Attribute(name, value) for name, value in zip(description.attribute_names, values)]
 
-        def get_sqlalchemy_attributes(model):
-            """
-            Get all attributes from a SQLAlchemy model excluding:
-             - primary keys
-             - foreign keys
-             - attributes that starts with an underscore
-            """
-            columns = []
-            for attr in inspect(model).attrs:
-                if isinstance(attr, ColumnProperty):
-                    col = attr.columns[0]
-                    if not col.primary_key and not col.foreign_keys and not col.name.startswith('_'):
-                        columns.append(col)
-            return columns
-
-        def extract_from_sql_alchemy(column):
-            """
-            Get information about an attribute extracted from an SQLAlchemy column
-            """
-            name = column.name
-            value = getattr(entity, column.name)
-            return Attribute(name, value)
-
-        return [extract_from_sql_alchemy(column) for column in get_sqlalchemy_attributes(entity.__class__)]
-
-    @staticmethod
-    def get_relationships(entity):
+    @classmethod
+    def get_relationships(cls, entity):
         """
         Get all the visible relationships of a model.
         :return an array Relationship objects
         """
 
-        def get_sqlalchemy_relationships(model):
-            return inspect(model).mapper.relationships.values()
-
-        def extract_relationship(relationship, entity):
+        def extract_relationship(name, type, to_many):
             """
             Extract information about an SQLAlchemy relationship
-            :param relationship: the SQLAlchemy relationship
             :return a Relationship object
             """
-
-            name = relationship.key
-            to_many = relationship.uselist
-            type = relationship.mapper.class_.hg_name()
             value = getattr(entity, name)
             if value is not None:
                 if to_many:
@@ -138,5 +274,54 @@ class SQLAlchemyModel(Model):
                     value = value.id
             return Relationship(name=name, value=value, type=type, to_many=to_many)
 
-        relationships_attributes = get_sqlalchemy_relationships(entity.__class__)
-        return [extract_relationship(rel, entity) for rel in relationships_attributes]
+        description = cls.describe(entity.__class__)
+        return [extract_relationship(*relationship) for relationship in description.relationships]
+
+
+class SQLAlchemyRowModel(Model):
+    """
+    A model extracted from a row selected with `SQLAlchemyRowModel.select`, without loading any
+    SQLAlchemy entity.
+    The row contains the primary key, the attributes, then the identifiers of the *-to-one relationships
+    stored in the model's table: these are the only relationships available.
+    """
+    __slots__ = ('_description',)
+
+    def __init__(self, row, description, name):
+        attributes_count = len(description.attribute_names)
+        self._set_values(description.attribute_names, row[1:1 + attributes_count], None, name, row)
+        self._description = description
+
+    @property
+    def relationships(self):
+        if self._relationships is None:
+            offset = len(self._description.columns)
+            self._relationships = [Relationship(name=name, value=self.source[offset + index], type=type)
+                                   for index, (name, type, _) in enumerate(self._description.foreign_keys)]
+        return self._relationships
+
+    @property
+    def id(self):
+        return self.source[0]
+
+    @staticmethod
+    def select(model):
+        """
+        Build the statement that selects what is needed to serialize the entities of a SQLAlchemy model.
+        :param model: the SQLAlchemy model class
+        :return: the select statement
+        """
+        description = SQLAlchemyModel.describe(model)
+        return select(list(description.columns) + [column for _, _, column in description.foreign_keys])
+
+    @classmethod
+    def from_rows(cls, model, rows):
+        """
+        Lazily create the models of rows selected with `SQLAlchemyRowModel.select`
+        :param model: the SQLAlchemy model class
+        :param rows: an iterable of rows
+        :return: a generator of models
+        """
+        description = SQLAlchemyModel.describe(model)
+        name = model.hg_name()
+        return (cls(row, description, name) for row in rows)
@@ -32,18 +32,27 @@ def get_user_jwt(request):
     return None
 
 
+def get_principals(request):
+    """
+    Get the principals of the user of a request.
+    Registered as a reified request method, so they are only computed once per request.
+    :return: a tuple of principals
+    """
+    principals = [Everyone]
+    user = request.user
+    if user:
+        principals += [Authenticated, 'u:%s' % user['id']]
+        principals.extend(('g:%s' % g['name'] for g in user['groups']))
+    return tuple(principals)
+
+
 class JWTAuthenticationPolicy(object):
     def authenticated_userid(self, request):
         if request.user:
             return request.user['id']
 
     def effective_principals(self, request):
-        principals = [Everyone]
-        user = request.user
-        if user:
-            principals += [Authenticated, 'u:%s' % user['id']]
-            principals.extend(('g:%s' % g['name'] for g in user['groups']))
-        return principals
+        return request.principals
 
     def remember(self, request, principal, **kw):
         return []
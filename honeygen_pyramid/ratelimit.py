@@ -0,0 +1,245 @@
+"""
+A tween that keeps a few heavy clients from saturating the database and starving everyone else.
+
+Clients are identified by their authenticated user (see `honeygen_pyramid.jwt.get_user_jwt`), or else by their IP:
+ - every client has a token bucket. Each request takes a token, and the tokens are refilled at a constant rate,
+   up to the size of the bucket, which allows short bursts
+ - the expensive actions (listing, emptying, exporting, importing or aggregating a collection) that run at the
+   same time are limited, for each client and for each model
+Rejected requests get a 429 response, whose Retry-After header tells when to try again.
+
+The state is kept in memory, in dicts whose keys are spread over a fixed number of locks, so the threads
+of the server only wait for each other when they handle requests whose keys share a lock.
+
+The tween is configured with these settings, and is disabled when they are all 0 (the default):
+ - ratelimit.rate: the number of requests per second allowed for each client, 0 for no limit
+ - ratelimit.burst: the size of the token bucket of each client (default: twice the rate)
+ - ratelimit.max_concurrent_per_client: the number of expensive actions a client can run at the same time,
+   0 for no limit
+ - ratelimit.max_concurrent_per_model: the number of expensive actions that can run at the same time on the
+   collection of a model, 0 for no limit
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import threading
+import time
+
+from honeygen_pyramid.errors import TooManyRequestsException
+from honeygen_pyramid.exposed import all_models
+
+"""
+The actions that can keep the database busy for a long time
+"""
+EXPENSIVE_ACTIONS = frozenset(['list', 'empty', 'export', 'import', 'aggregate'])
+
+"""
+The action of each method, for a collection and for an item.
+HEAD requests are handled by the GET views, so they cost as much as GET requests
+"""
+COLLECTION_ACTIONS = {'GET': 'list', 'HEAD': 'list', 'POST': 'add', 'DELETE': 'empty'}
+ITEM_ACTIONS = {'GET': 'read', 'HEAD': 'read', 'PATCH': 'update', 'DELETE': 'delete'}
+
+"""
+The number of locks the keys of a store are spread over
+"""
+STRIPES = 64
+
+"""
+The number of seconds between two removals of the full token buckets
+"""
+SWEEP_INTERVAL = 60
+
+
+class StripedStore(object):
+    """
+    A dict shared by threads, whose keys are spread over several locks
+    """
+
+    def __init__(self, stripes=STRIPES):
+        self.values = {}
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def lock(self, key):
+        """
+        :return: the lock that guards a key
+        """
+        return self.locks[hash(key) % len(self.locks)]
+
+
+class TokenBuckets(StripedStore):
+    """
+    The token buckets of the clients. A bucket that is not in the store is full.
+    """
+
+    def __init__(self, rate, burst, stripes=STRIPES):
+        super().__init__(stripes)
+        self.rate = rate
+        self.burst = burst
+        self.swept = time.monotonic()
+        self.sweeping = threading.Lock()
+
+    def take(self, key, now=None):
+        """
+        Take a token from the bucket of a client
+        :param key: the client
+        :param now: the current time, from time.monotonic()
+        :return: 0 if a token was taken, otherwise the number of seconds before a token is available
+        """
+        now = time.monotonic() if now is None else now
+        if now - self.swept >= SWEEP_INTERVAL:
+            self.sweep(now)
+        with self.lock(key):
+            tokens, updated = self.values.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self.values[key] = (tokens - 1, now)
+                return 0
+            self.values[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def sweep(self, now=None):
+        """
+        Remove the buckets that are full again, so the store does not grow with the number of clients ever seen
+        """
+        if not self.sweeping.acquire(False):
+            return  # Another thread is sweeping
+        try:
+            now = time.monotonic() if now is None else now
+            self.swept = now
+            refill_time = self.burst / self.rate
+            for key, (_, updated) in list(self.values.items()):
+                if now - updated >= refill_time:
+                    with self.lock(key):
+                        value = self.values.get(key)
+                        if value is not None and now - value[1] >= refill_time:
+                            del self.values[key]
+        finally:
+            self.sweeping.release()
+
+
+class InFlightCounters(StripedStore):
+    """
+    The number of actions running at the same time, by key. Keys whose count is 0 are removed.
+    """
+
+    def acquire(self, key, limit):
+        """
+        Count one more running action, unless the limit is reached
+        :return: True if the action can run, False otherwise
+        """
+        with self.lock(key):
+            count = self.values.get(key, 0)
+            if count >= limit:
+                return False
+            self.values[key] = count + 1
+            return True
+
+    def release(self, key):
+        with self.lock(key):
+            count = self.values[key] - 1
+            if count:
+                self.values[key] = count
+            else:
+                del self.values[key]
+
+
+def get_client(request):
+    """
+    Get the key identifying the client of a request: its user if it is authenticated, otherwise its IP
+    """
+    user = request.user
+    if user:
+        return 'u:{}'.format(user['id'])
+    return 'ip:{}'.format(request.remote_addr or '')
+
+
+def get_action(request, collections):
+    """
+    Find which model and action a request is for, without traversing the resources
+    :param request: the request
+    :param collections: the models, by URL of their collection
+    :return: the model and the action, or None and None if the request is not for a model
+    """
+    segments = [segment for segment in request.path_info.split('/') if segment]
+    model = collections.get(segments[0]) if segments else None
+    if model is None:
+        return None, None
+    if len(segments) == 1:
+        return model, COLLECTION_ACTIONS.get(request.method)
+    if len(segments) == 2 and segments[1] in model.resource_collection.view_names:
+        return model, segments[1]
+    return model, ITEM_ACTIONS.get(request.method)
+
+
+class ReleasingAppIter(object):
+    """
+    A streamed body that calls `release` when it is closed, since the database is used until then.
+    The WSGI server closes the body even if it is never iterated, for example for HEAD requests or when the client
+    disconnects before the first chunk, unlike the `finally` of a generator that has not started.
+    """
+
+    def __init__(self, app_iter, release):
+        self.app_iter = app_iter
+        self.release = release
+        self.released = False
+
+    def __iter__(self):
+        return iter(self.app_iter)
+
+    def close(self):
+        try:
+            close = getattr(self.app_iter, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            if not self.released:
+                self.released = True
+                self.release()
+
+
+def rate_limit_tween_factory(handler, registry):
+    settings = registry.settings
+    rate = float(settings.get('ratelimit.rate', 0))
+    burst = float(settings.get('ratelimit.burst', 0)) or 2 * rate
+    per_client = int(settings.get('ratelimit.max_concurrent_per_client', 0))
+    per_model = int(settings.get('ratelimit.max_concurrent_per_model', 0))
+    if not (rate or per_client or per_model):
+        return handler
+
+    buckets = TokenBuckets(rate, max(burst, 1)) if rate else None
+    in_flight = InFlightCounters()
+    collections = {model_info['url']: model for model, model_info in all_models.items()}
+
+    def rate_limit_tween(request):
+        client = get_client(request)
+        if buckets is not None:
+            wait = buckets.take(client)
+            if wait:
+                raise TooManyRequestsException('Too many requests, retry in {:.0f}s'.format(wait), wait)
+        model, action = get_action(request, collections)
+        if action not in EXPENSIVE_ACTIONS or not (per_client or per_model):
+            return handler(request)
+
+        acquired = []
+
+        def release():
+            for key in acquired:
+                in_flight.release(key)
+
+        try:
+            for key, limit in ((('client', client), per_client), (('model', model.hg_name()), per_model)):
+                if not limit:
+                    continue
+                if not in_flight.acquire(key, limit):
+                    raise TooManyRequestsException('Too many concurrent requests on {}'.format(model.hg_url()), 1)
+                acquired.append(key)
+            response = handler(request)
+        except BaseException:
+            release()
+            raise
+        if isinstance(response.app_iter, (list, tuple)):
+            release()
+        else:
+            response.app_iter = ReleasingAppIter(response.app_iter, release)
+        return response
+
+    return rate_limit_tween
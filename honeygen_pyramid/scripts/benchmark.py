@@ -0,0 +1,250 @@
+"""
+End-to-end benchmark of the generated REST endpoints.
+
+The benchmark builds the application with `honeygen_pyramid.main` against a freshly
+seeded SQLite file for each table size, drives the endpoints through WebTest and
+records, for each scenario:
+ - the latency percentiles (in milliseconds)
+ - the number of SQL statements per request
+ - the peak memory allocated while serving one request (in bytes)
+
+The results are written to a JSON file, and can be compared against a stored baseline:
+any regression makes the command exit with a non-zero status.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from pyramid_sqlalchemy import Session
+import transaction
+from zope.sqlalchemy import mark_changed
+
+from honeygen_pyramid.testing import AllocationRecorder, QueryRecorder
+
+DEFAULT_SIZES = (10, 100, 1000)
+DEFAULT_ITERATIONS = 20
+DEFAULT_TOLERANCE = 0.5
+
+"""
+The metrics compared against the baseline, and whether they are compared with a tolerance.
+Query counts are deterministic, so any increase is a regression.
+"""
+COMPARED_METRICS = {
+    'p50': True,
+    'p95': True,
+    'peak_memory': True,
+    'queries': False,
+}
+
+
+def percentile(values, percent):
+    """
+    Get a percentile of a list of values, using the nearest-rank method
+    :param values: the values
+    :param percent: the percentile to get (between 0 and 100)
+    :return: the percentile
+    """
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def seed(size):
+    """
+    Seed the database with `size` users.
+    Every user is the best friend of the next one, the first half of the users own an address,
+    and the first user owns a large number of addresses to produce relationship-heavy payloads.
+    :param size: the number of users to create
+    """
+    from honeygen_pyramid.src import User, Address
+
+    with transaction.manager:
+        Session.bulk_insert_mappings(User, [
+            {'id': id, 'name': 'User {}'.format(id), 'age': id % 100, 'best_friend_id': id - 1 if id > 1 else None}
+            for id in range(1, size + 1)
+        ])
+        addresses = [{'city': 'City {}'.format(id), 'owner_id': id} for id in range(1, size // 2 + 1)]
+        addresses += [{'city': 'Paris', 'owner_id': 1} for _ in range(size // 4)]
+        Session.bulk_insert_mappings(Address, addresses)
+        mark_changed(Session())  # Bulk operations are not seen by the transaction manager
+
+
+def make_app(path):
+    """
+    Build the application against a SQLite file
+    :param path: the path of the SQLite file
+    :return: the WSGI application
+    """
+    from honeygen_pyramid import main
+    from honeygen_pyramid.base_model import BaseModel
+
+    Session.remove()
+    settings = {
+        'sqlalchemy.url': 'sqlite:///{}'.format(path),
+        'jwt.secret_key': 'benchmark',
+        'pyramid.includes': 'pyramid_tm',
+    }
+    app = main({}, **settings)
+    BaseModel.metadata.create_all(Session.get_bind())
+    return app
+
+
+def scenarios(size):
+    """
+    Get the scenarios to run for a table size.
+    A scenario is a name, an HTTP method, a function giving the path and the body of the request for an iteration,
+    and the number of rows a request transfers (for the bulk scenarios)
+    """
+
+    def import_body(iteration):
+        # Each iteration imports new users, after the ones of the previous iterations
+        first = size * (iteration + 1) + 1
+        return ''.join(json.dumps({'id': id, 'name': 'User {}'.format(id), 'age': id % 100}) + '\n'
+                       for id in range(first, first + size)).encode('utf-8')
+
+    return [
+        ('list_users', 'GET', lambda iteration: ('/users', None), None),
+        ('get_user', 'GET', lambda iteration: ('/users/{}'.format(size - iteration % (size // 2)), None), None),
+        ('get_user_with_relationships', 'GET', lambda iteration: ('/users/1', None), None),
+        ('export_users_ndjson', 'GET', lambda iteration: ('/users/export?format=ndjson', None), size),
+        ('export_users_csv', 'GET', lambda iteration: ('/users/export?format=csv', None), size),
+        # Users are deleted from the last one, because they do not own any address
+        ('delete_user', 'DELETE', lambda iteration: ('/users/{}'.format(size - iteration), None), None),
+        # Imports come last because they change the size of the table
+        ('import_users_ndjson', 'POST', lambda iteration: ('/users/import?format=ndjson', import_body(iteration)),
+         size),
+    ]
+
+
+def run_scenario(app, counter, method, request, iterations, rows=None):
+    """
+    Run a scenario and measure it
+    :return: the measures of the scenario
+    """
+    expected_status = 204 if method == 'DELETE' else 200
+    latencies = []
+    queries = []
+    for iteration in range(iterations):
+        path, body = request(iteration)
+        counter.reset()
+        start = time.perf_counter()
+        app.request(path, method=method, body=body or b'', status=expected_status)
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+
+    # Memory is measured on its own request, because tracing allocations slows down the timed ones
+    path, body = request(iterations)
+    with AllocationRecorder() as allocations:
+        app.request(path, method=method, body=body or b'', status=expected_status)
+
+    measures = {
+        'iterations': iterations,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': sum(latencies) / len(latencies),
+        'queries': max(queries),
+        'peak_memory': allocations.peak,
+    }
+    if rows is not None:
+        measures['rows_per_minute'] = rows / measures['p50'] * 60000
+    return measures
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, iterations=DEFAULT_ITERATIONS):
+    """
+    Run all the scenarios for all the table sizes
+    :param sizes: the table sizes
+    :param iterations: the number of timed requests per scenario
+    :return: the results, indexed by size and scenario name
+    """
+    from webtest import TestApp
+
+    results = {}
+    for size in sizes:
+        if size < 2 * (iterations + 1):
+            raise ValueError('The table size {} is too small for {} iterations'.format(size, iterations))
+        with tempfile.TemporaryDirectory() as directory:
+            app = TestApp(make_app(os.path.join(directory, 'benchmark.sqlite')))
+            seed(size)
+            counter = QueryRecorder().start()
+            try:
+                results[str(size)] = {
+                    name: run_scenario(app, counter, method, request, iterations, rows)
+                    for name, method, request, rows in scenarios(size)
+                }
+            finally:
+                counter.stop()
+                Session.remove()
+    return {
+        'python': platform.python_version(),
+        'iterations': iterations,
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results against a baseline.
+    Only the sizes and scenarios present in both are compared.
+    :param tolerance: the allowed relative increase of the timing and memory metrics
+    :return: a list of human-readable regressions (empty if there is none)
+    """
+    regressions = []
+    for size, scenarios_results in sorted(results['results'].items()):
+        for name, measures in sorted(scenarios_results.items()):
+            reference = baseline.get('results', {}).get(size, {}).get(name)
+            if reference is None:
+                continue
+            for metric, tolerated in sorted(COMPARED_METRICS.items()):
+                if metric not in reference:
+                    continue
+                limit = reference[metric] * (1 + tolerance) if tolerated else reference[metric]
+                if measures[metric] > limit:
+                    regressions.append('{} (size {}): {} went from {:.2f} to {:.2f}'.format(
+                        name, size, metric, reference[metric], measures[metric]))
+    return regressions
+
+
+def usage(argv):
+    parser = argparse.ArgumentParser(prog=os.path.basename(argv[0]), description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated table sizes (default: %(default)s)')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                        help='timed requests per scenario (default: %(default)s)')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='the JSON file to write the results to (default: %(default)s)')
+    parser.add_argument('--baseline', help='a previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative increase of timings and memory (default: %(default)s)')
+    return parser
+
+
+def main(argv=sys.argv):
+    arguments = usage(argv).parse_args(argv[1:])
+    sizes = [int(size) for size in arguments.sizes.split(',')]
+    baseline = None
+    if arguments.baseline:
+        # Read first, since the output may replace it
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)
+    results = run_benchmark(sizes, arguments.iterations)
+    with open(arguments.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    for size, scenarios_results in sorted(results['results'].items(), key=lambda item: int(item[0])):
+        for name, measures in sorted(scenarios_results.items()):
+            print('{:>8} {:<30} p50={p50:8.2f}ms p95={p95:8.2f}ms queries={queries:6} peak={peak_memory:10}B'.format(
+                size, name, **measures))
+
+    if baseline is not None:
+        regressions = compare(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if regressions:
+            sys.exit(1)
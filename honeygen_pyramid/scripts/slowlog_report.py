@@ -0,0 +1,119 @@
+"""
+Summarize the log of the slow queries and requests (see `honeygen_pyramid.slowlog`).
+
+The slow requests are grouped by endpoint (model and action), and the slow queries by statement,
+the slowest first. The plan of the slowest run of each statement is shown below it.
+"""
+import argparse
+from collections import defaultdict
+import json
+import os
+import sys
+
+from pyramid.paster import get_appsettings
+from pyramid.scripts.common import parse_vars
+
+from honeygen_pyramid.scripts.benchmark import percentile
+
+
+def read_entries(path, backup_count):
+    """
+    Read the entries of a log and of its rotated files, the oldest first
+    :param path: the log file
+    :param backup_count: the number of rotated files
+    :return: a generator of dicts
+    """
+    paths = ['{}.{}'.format(path, index) for index in range(backup_count, 0, -1)] + [path]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # A line being written when the file was read
+
+
+def summarize(entries):
+    """
+    Group the entries of a log
+    :param entries: the entries
+    :return: the statistics of the endpoints, and of the statements, the slowest first
+    """
+    requests, queries = defaultdict(list), defaultdict(list)
+    for entry in entries:
+        if entry.get('type') == 'request':
+            requests[(entry['model'], entry['action'])].append(entry)
+        elif entry.get('type') == 'query':
+            queries[entry['statement']].append(entry)
+
+    endpoints = []
+    for (model, action), group in requests.items():
+        durations = [entry['duration_ms'] for entry in group]
+        endpoints.append({
+            'model': model,
+            'action': action,
+            'count': len(group),
+            'p50': percentile(durations, 50),
+            'p95': percentile(durations, 95),
+            'max': max(durations),
+            'queries': sum(entry['queries'] for entry in group) / len(group),
+            'query_ms': sum(entry['query_ms'] for entry in group) / len(group),
+        })
+
+    statements = []
+    for statement, group in queries.items():
+        slowest = max(group, key=lambda entry: entry['duration_ms'])
+        statements.append({
+            'statement': statement,
+            'count': len(group),
+            'total': sum(entry['duration_ms'] for entry in group),
+            'max': slowest['duration_ms'],
+            'endpoints': sorted({'{} {}'.format(entry['model'], entry['action']) for entry in group}),
+            'parameters': slowest['parameters'],
+            'plan': slowest['plan'],
+        })
+
+    endpoints.sort(key=lambda endpoint: endpoint['p95'], reverse=True)
+    statements.sort(key=lambda statement: statement['total'], reverse=True)
+    return endpoints, statements
+
+
+def print_report(endpoints, statements, top, out=sys.stdout):
+    print('Slow requests, by endpoint', file=out)
+    for endpoint in endpoints[:top]:
+        print('  {model!s:>12} {action!s:<10} count={count:<6} p50={p50:9.2f}ms p95={p95:9.2f}ms max={max:9.2f}ms '
+              'queries={queries:.1f} ({query_ms:.2f}ms)'.format(**endpoint), file=out)
+
+    print('Slow queries, by statement', file=out)
+    for statement in statements[:top]:
+        print('  count={count:<6} total={total:10.2f}ms max={max:9.2f}ms in {endpoints}'.format(
+            endpoints=', '.join(statement['endpoints']), **{key: statement[key] for key in ('count', 'total', 'max')}),
+            file=out)
+        print('    ' + ' '.join(statement['statement'].split()), file=out)
+        print('    parameters: {}'.format(json.dumps(statement['parameters'])), file=out)
+        for row in statement['plan'] or ():
+            print('    plan: {}'.format(' | '.join(str(value) for value in row) if isinstance(row, list) else row),
+                  file=out)
+
+
+def usage(argv):
+    parser = argparse.ArgumentParser(prog=os.path.basename(argv[0]), description=__doc__.strip().splitlines()[0])
+    parser.add_argument('config_uri', help='the configuration file of the application, for example development.ini')
+    parser.add_argument('options', nargs='*', metavar='var=value', help='variables of the configuration file')
+    parser.add_argument('--top', type=int, default=20,
+                        help='the number of endpoints and statements to show (default: %(default)s)')
+    return parser
+
+
+def main(argv=sys.argv):
+    arguments = usage(argv).parse_args(argv[1:])
+    settings = get_appsettings(arguments.config_uri, options=parse_vars(arguments.options))
+    path = settings.get('slowlog.path')
+    if not path:
+        print('slowlog.path is not set in {}'.format(arguments.config_uri), file=sys.stderr)
+        sys.exit(1)
+    entries = read_entries(path, int(settings.get('slowlog.backup_count', 5)))
+    endpoints, statements = summarize(entries)
+    print_report(endpoints, statements, arguments.top)
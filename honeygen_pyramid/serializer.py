@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import inflect
 
 from honeygen_pyramid.introspector import Attribute
@@ -5,6 +7,15 @@ from honeygen_pyramid.introspector import Attribute
 pluralizer = inflect.engine()
 
 
+@lru_cache(maxsize=None)
+def pluralize(name):
+    """
+    Get the plural of a model name.
+    Pluralizing is slow and the same few names are pluralized for every serialized entity, so it is cached.
+    """
+    return pluralizer.plural(name)
+
+
 class ComputedAttribute(Attribute):
     """
     An annotation used to add dynamic attributes to objects to serialize.
@@ -109,31 +120,28 @@ class Serializer(object):
             """
             decorated_method = getattr(self, name)  # The method decorated by @ComputedAttribute
             computed_attribute = decorated_method.__computed_attribute__  # The computed attribute
-            computed_attribute.name = computed_attribute.name or name  # We override the name eventually
-            computed_attribute.value = decorated_method(model)  # We set the value of the computed attribute
-            return computed_attribute  # We directly return the attribute, since ComputedAttribute is an Attribute
-
-        def get_computed_attributes():
-            """
-            Get all the attributes name of the "computed attributes" of the serializer.
-            An "computed attribute" is a function annotated with "computed_attribute"
-            """
+            # The computed attribute is shared by all the requests, so a new attribute is built for each model
+            return Attribute(computed_attribute.name or name, decorated_method(model), computed_attribute.type)
 
-            def is_computed_attribute(attribute_name):
-                """
-                Check whether an attribute is annotated with "computed_attribute" or not
-                """
-                attribute = getattr(self, attribute_name)
-                return ComputedAttribute.is_present_on(attribute)
-
-            all_attributes_name = [name for name in dir(self)]
-            return [attribute_name for attribute_name in all_attributes_name if is_computed_attribute(attribute_name)]
-
-        computed_attributes = [extract_from_computed_attribute(name) for name in get_computed_attributes()]
+        computed_attributes = [extract_from_computed_attribute(name) for name in self.get_computed_attributes()]
         all_attributes = model.attributes + computed_attributes
 
         return [attribute for attribute in all_attributes if attribute.name not in self.hidden]
 
+    @classmethod
+    def get_computed_attributes(cls):
+        """
+        Get all the attributes name of the "computed attributes" of the serializer.
+        An "computed attribute" is a function annotated with "computed_attribute".
+        They are looked up once per serializer class.
+        :return: a tuple of names
+        """
+        names = cls.__dict__.get('_computed_attributes')
+        if names is None:
+            names = tuple(name for name in dir(cls) if ComputedAttribute.is_present_on(getattr(cls, name, None)))
+            cls._computed_attributes = names
+        return names
+
     def get_relationships(self, model):
         """
         Get all the relationships to serialize in a model
@@ -163,8 +171,8 @@ class Serializer(object):
 class JSONAPISerializer(Serializer):
     def serialize(self, model):
         return {
-            'id': model.source.id,
-            'type': pluralizer.plural(model.name),
+            'id': model.id,
+            'type': pluralize(model.name),
             'data': self._serialize_data(model),
         }
 
@@ -175,15 +183,15 @@ class JSONAPISerializer(Serializer):
 
     def _serialize_in_list(self, model):
         return {
-            'type': pluralizer.plural(model.name),
-            'id': model.source.id,
+            'type': pluralize(model.name),
+            'id': model.id,
             'attributes': self._serialize_attributes(model)
         }
 
     def serialize_as_rio(self, model):
         return {
             'id': model.id,
-            'type': pluralizer.pluralize(model.name),
+            'type': pluralize(model.name),
         }
 
     def _serialize_data(self, model):
@@ -193,7 +201,11 @@ class JSONAPISerializer(Serializer):
         }
 
     def _serialize_attributes(self, model):
-        return {attribute.name: self.serialize_attribute(attribute) for attribute in model.attributes}
+        if (type(self).serialize_attribute is Serializer.serialize_attribute and not self.hidden
+                and not self.get_computed_attributes()):
+            # The values are serialized as they are, so there is no need to wrap them into attributes
+            return dict(zip(model.attribute_names, model.attribute_values))
+        return {attribute.name: self.serialize_attribute(attribute) for attribute in self.get_attributes(model)}
 
     def _serialize_relationships(self, model):
         return {relationship.name: self.serialize_relationship(relationship) for relationship in model.relationships}
@@ -0,0 +1,240 @@
+"""
+An opt-in log of the slow SQL queries and of the slow requests, to find which endpoints are slow and why.
+
+The queries are timed with the events of the engine, so the queries run while traversing the resources
+are logged as well as those of the views. The queries that run after the view returns, while a streamed
+response is sent, are attributed to their request by the REQUEST_OPTION execution option, and a streamed
+request is only logged once its body is closed. A query slower than the threshold is logged with the model and
+the action of the request that ran it, its bound parameters, and the plan of the database (for example
+EXPLAIN QUERY PLAN with SQLite). A request slower than its threshold is logged with its number of queries,
+and the time spent running them.
+
+Each entry is a JSON object on its own line, in a file that is rotated when it gets too big.
+The `report_honeygen_pyramid_slowlog` command summarizes it.
+
+The log is configured with these settings, and is disabled when slowlog.path is not set (the default):
+ - slowlog.path: the file to write the log to
+ - slowlog.query_threshold: the duration above which a query is logged, in milliseconds (default 100)
+ - slowlog.request_threshold: the duration above which a request is logged, in milliseconds (default 500)
+ - slowlog.explain: whether the plans of the slow queries are captured (default true)
+ - slowlog.max_bytes: the size of the file above which it is rotated, in bytes (default 10 MB)
+ - slowlog.backup_count: the number of rotated files to keep (default 5)
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+import datetime
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import time
+
+from pyramid.settings import asbool
+from pyramid.threadlocal import get_current_request
+from pyramid_sqlalchemy import Session
+from sqlalchemy import event
+
+from honeygen_pyramid.exposed import all_models
+from honeygen_pyramid.ratelimit import get_action, ReleasingAppIter
+
+"""
+The statement used to get the plan of a query, by database
+"""
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+"""
+The statements whose plan is asked: explaining the others is not always possible, nor harmless
+"""
+EXPLAINED_STATEMENTS = frozenset(['SELECT', 'WITH'])
+
+"""
+The databases on which a failed statement aborts the transaction, so the plans are asked in a savepoint.
+With SQLite, it does not, and savepoints would interfere with the transactions of its DBAPI.
+"""
+SAVEPOINT_DIALECTS = frozenset(['postgresql', 'mysql'])
+
+"""
+The key of the query statistics of a request, in its WSGI environment
+"""
+ENVIRON_KEY = 'honeygen_pyramid.slowlog'
+
+"""
+The execution option that gives the request of a statement run outside of the request's thread-local context,
+for example while a streamed response is sent: `statement.execution_options(**{REQUEST_OPTION: request})`
+"""
+REQUEST_OPTION = 'hg_request'
+
+
+class SlowLog(object):
+    """
+    Time the queries of an engine and the requests, and log the slow ones
+    """
+
+    def __init__(self, path, query_threshold=100, request_threshold=500, explain=True,
+                 max_bytes=10 * 1024 * 1024, backup_count=5):
+        """
+        :param path: the file to write the log to
+        :param query_threshold: the duration above which a query is logged, in milliseconds
+        :param request_threshold: the duration above which a request is logged, in milliseconds
+        :param explain: whether the plans of the slow queries are captured
+        :param max_bytes: the size of the file above which it is rotated, in bytes
+        :param backup_count: the number of rotated files to keep
+        """
+        self.query_threshold = query_threshold
+        self.request_threshold = request_threshold
+        self.explain = explain
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self.collections = {model_info['url']: model for model, model_info in all_models.items()}
+
+    def listen(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def close(self):
+        self.handler.close()
+
+    def write(self, entry):
+        """
+        Append an entry to the log
+        :param entry: a dict
+        """
+        entry['time'] = datetime.datetime.utcnow().isoformat() + 'Z'
+        line = json.dumps(entry, default=str, sort_keys=True)
+        self.handler.handle(logging.makeLogRecord({'msg': line, 'levelno': logging.INFO}))
+
+    def describe(self, request):
+        """
+        Get what identifies the endpoint of a request in the log
+        """
+        if request is None:
+            return {'model': None, 'action': None, 'method': None, 'path': None}
+        model, action = get_action(request, self.collections)
+        return {
+            'model': model.hg_name() if model is not None else None,
+            'action': action,
+            'method': request.method,
+            'path': request.path_info,
+        }
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('hg_query_start', []).append((context, time.perf_counter()))
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = (time.perf_counter() - conn.info['hg_query_start'].pop()[1]) * 1000
+        request = context.execution_options.get(REQUEST_OPTION) if context is not None else None
+        if request is None:
+            request = get_current_request()
+        if request is not None:
+            statistics = request.environ.setdefault(ENVIRON_KEY, [0, 0.0])
+            statistics[0] += 1
+            statistics[1] += duration
+        if duration < self.query_threshold:
+            return
+        entry = self.describe(request)
+        entry.update({
+            'type': 'query',
+            'duration_ms': round(duration, 3),
+            'statement': statement,
+            'parameters': parameters,
+            'plan': self.get_plan(conn, statement, parameters) if self.explain and not executemany else None,
+        })
+        self.write(entry)
+
+    def _handle_error(self, exception_context):
+        """
+        Forget the start of a statement that failed, since it will not be followed by after_cursor_execute.
+        The statement may also have failed before being started, for example while its parameters were processed.
+        """
+        conn = exception_context.connection
+        starts = conn.info.get('hg_query_start') if conn is not None else None
+        if starts and starts[-1][0] is exception_context.execution_context:
+            starts.pop()
+
+    def get_plan(self, conn, statement, parameters):
+        """
+        Ask the database for the plan of a query. Only the queries that read are explained.
+        The plan is asked in a savepoint, rolled back if it fails, because a failed statement aborts the whole
+        transaction on some databases (PostgreSQL), which would make the rest of the request fail.
+        :return: the rows of the plan, or None if the database cannot explain the query
+        """
+        prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+        words = statement.split(None, 1)
+        if prefix is None or not words or words[0].upper() not in EXPLAINED_STATEMENTS:
+            return None
+        use_savepoint = conn.dialect.name in SAVEPOINT_DIALECTS
+        # The plan is asked with a cursor of the DBAPI, so the query is not seen by the events
+        cursor = conn.connection.cursor()
+        try:
+            if use_savepoint:
+                try:
+                    cursor.execute('SAVEPOINT hg_explain')
+                except Exception:
+                    return None  # Not in a transaction
+            try:
+                cursor.execute(prefix + statement, parameters)
+                plan = [list(row) for row in cursor.fetchall()]
+            except Exception as e:
+                if use_savepoint:
+                    cursor.execute('ROLLBACK TO SAVEPOINT hg_explain')
+                return ['Cannot explain the query: {}'.format(e)]
+            if use_savepoint:
+                cursor.execute('RELEASE SAVEPOINT hg_explain')
+            return plan
+        finally:
+            cursor.close()
+
+    def log_request(self, request, response, duration):
+        """
+        Log a request if it is slow
+        :param duration: the duration of the request, in milliseconds
+        """
+        if duration < self.request_threshold:
+            return
+        queries, query_duration = request.environ.get(ENVIRON_KEY, (0, 0.0))
+        entry = self.describe(request)
+        entry.update({
+            'type': 'request',
+            'duration_ms': round(duration, 3),
+            'status': response.status_code if response is not None else None,
+            'queries': queries,
+            'query_ms': round(query_duration, 3),
+        })
+        self.write(entry)
+
+
+def slow_log_tween_factory(handler, registry):
+    settings = registry.settings
+    path = settings.get('slowlog.path')
+    if not path:
+        return handler
+    slow_log = SlowLog(path,
+                       query_threshold=float(settings.get('slowlog.query_threshold', 100)),
+                       request_threshold=float(settings.get('slowlog.request_threshold', 500)),
+                       explain=asbool(settings.get('slowlog.explain', True)),
+                       max_bytes=int(settings.get('slowlog.max_bytes', 10 * 1024 * 1024)),
+                       backup_count=int(settings.get('slowlog.backup_count', 5)))
+    slow_log.listen(Session.get_bind())
+
+    def slow_log_tween(request):
+        start = time.perf_counter()
+
+        def log(response=None):
+            slow_log.log_request(request, response, (time.perf_counter() - start) * 1000)
+
+        try:
+            response = handler(request)
+        except BaseException:
+            log()
+            raise
+        if isinstance(response.app_iter, (list, tuple)):
+            log(response)
+        else:
+            # The request lasts until its body is sent, and its queries may run until then
+            response.app_iter = ReleasingAppIter(response.app_iter, lambda: log(response))
+        return response
+
+    slow_log_tween.slow_log = slow_log
+    return slow_log_tween
@@ -23,3 +23,11 @@ class User(BaseModel):
 
     best_friend_id = Column(Integer, ForeignKey('users.id'))
     best_friend = relationship('User', uselist=False)
+
+    @classmethod
+    def hg_track_changes(cls):
+        return True
+
+    @classmethod
+    def hg_coalesce_reads(cls):
+        return True
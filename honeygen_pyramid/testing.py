@@ -0,0 +1,197 @@
+"""
+Helpers to guard the views against performance regressions.
+
+Performance problems usually show up as extra SQL statements or extra allocations, so
+these helpers record both around a block of code:
+
+```
+class UserViewsTest(ViewTestCase):
+    def test_list(self):
+        with self.assertMaxQueries(3), self.assertMaxMemory(512 * 1024):
+            call_view(User, 'list')
+```
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+from contextlib import contextmanager
+import tracemalloc
+import unittest
+
+from pyramid import testing
+from pyramid_sqlalchemy import Session
+from sqlalchemy import create_engine, event
+import transaction
+
+from honeygen_pyramid.base_model import BaseModel
+from honeygen_pyramid.base_resource import Root
+from honeygen_pyramid.exposed import all_models
+
+
+class QueryRecorder(object):
+    """
+    Record the SQL statements executed by an engine while it is active.
+    Can be used as a context manager.
+    """
+
+    def __init__(self, engine=None):
+        """
+        :param engine: the engine to listen to, by default the one bound to the session
+        """
+        self.engine = engine if engine is not None else Session.get_bind()
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def start(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def stop(self):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+    def reset(self):
+        self.statements = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class AllocationRecorder(object):
+    """
+    Record the memory allocated while it is active, using tracemalloc.
+    Can be used as a context manager.
+    """
+
+    def __init__(self):
+        self.peak = 0
+        self.allocated = 0
+        self._was_tracing = False
+
+    def __enter__(self):
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._start, _ = tracemalloc.get_traced_memory()
+        return self
+
+    def __exit__(self, *exc_info):
+        current, peak = tracemalloc.get_traced_memory()
+        if not self._was_tracing:
+            tracemalloc.stop()
+        self.peak = peak - self._start
+        self.allocated = current - self._start
+
+
+def call_view(model, action, id=None, request=None):
+    """
+    Call a view of a model the way Pyramid would, including the traversal of its resource.
+    Permissions are not checked.
+    :param model: the model class
+    :param action: the view method to call (for example 'read' or 'list')
+    :param id: the identifier of the item, or None to call a collection view
+    :param request: the request, by default a dummy one
+    :return: the result of the view
+    """
+    model_info = all_models[model]
+    request = request if request is not None else testing.DummyRequest()
+    if not hasattr(request, 'user'):
+        request.user = None
+    context = Root(request)[model_info['url']]
+    if id is None:
+        _, view = model_info['collection_view']
+    else:
+        context = context[id]
+        _, view = model_info['item_view']
+    return getattr(view(context, request), action)()
+
+
+class ViewTestCase(unittest.TestCase):
+    """
+    A test case bound to a fresh in-memory database, with assertions on the
+    number of queries and the memory used by a block of code.
+    """
+
+    def setUp(self):
+        self.config = testing.setUp()
+        self.engine = create_engine('sqlite://')
+        Session.configure(bind=self.engine)
+        BaseModel.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        transaction.abort()
+        Session.remove()
+        self.engine.dispose()
+        testing.tearDown()
+
+    @contextmanager
+    def assertMaxQueries(self, maximum):
+        """
+        Assert that a block of code executes at most `maximum` SQL statements
+        """
+        with QueryRecorder(self.engine) as recorder:
+            yield recorder
+        if recorder.count > maximum:
+            statements = '\n'.join(statement for statement, _ in recorder.statements)
+            self.fail('{} queries executed, expected at most {}:\n{}'.format(recorder.count, maximum, statements))
+
+    @contextmanager
+    def assertMaxMemory(self, maximum):
+        """
+        Assert that the memory allocated at the peak of a block of code is at most `maximum` bytes
+        """
+        with AllocationRecorder() as recorder:
+            yield recorder
+        if recorder.peak > maximum:
+            self.fail('{} bytes allocated at peak, expected at most {}'.format(recorder.peak, maximum))
+
+
+class AppTestCase(ViewTestCase):
+    """
+    A test case that drives the whole application through WebTest, against a fresh in-memory database.
+    """
+
+    """
+    Settings added to the default ones when creating the application
+    """
+    settings = {}
+
+    def setUp(self):
+        from webtest import TestApp
+        from honeygen_pyramid import main
+
+        settings = {
+            'sqlalchemy.url': 'sqlite://',
+            'jwt.secret_key': 'a secret key long enough for HS256 tokens',
+            'pyramid.includes': 'pyramid_tm',
+        }
+        settings.update(self.settings)
+        self.app = TestApp(main({}, **settings))
+        self.engine = Session.get_bind()
+        BaseModel.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        transaction.abort()
+        Session.remove()
+        self.engine.dispose()
+
+    def authorization(self, id, *groups):
+        """
+        Get the headers that authenticate a request as a user
+        :param id: the identifier of the user
+        :param groups: the name of the groups of the user
+        """
+        import jwt
+
+        token = jwt.encode({'user': {'id': id, 'groups': [{'name': group} for group in groups]}},
+                           self.app.app.registry.settings['jwt.secret_key'], algorithm='HS256')
+        if not isinstance(token, str):
+            token = token.decode('ascii')
+        return {'Authorization': 'JWT ' + token}
@@ -0,0 +1,39 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+from pyramid.security import Allow, Authenticated, ALL_PERMISSIONS, DENY_ALL
+from sqlalchemy import Column, Integer, Text
+
+from honeygen_pyramid.base_model import BaseModel
+from honeygen_pyramid.errors import ValidationException
+from honeygen_pyramid.exposed import exposed
+
+
+@exposed
+class Account(BaseModel):
+    """
+    A model with a column that must never be visible through the API, and a validation
+    """
+    __tablename__ = 'accounts'
+
+    id = Column(Integer, primary_key=True)
+    login = Column(Text, nullable=False)
+    _password = Column(Text)
+
+    def validate(self):
+        if not self.login:
+            raise ValidationException('The login of an account cannot be empty')
+
+
+@exposed
+class Report(BaseModel):
+    """
+    A model that authenticated users can list, but that only administrators can read or change
+    """
+    __tablename__ = 'reports'
+
+    id = Column(Integer, primary_key=True)
+    title = Column(Text)
+
+    @classmethod
+    def hg_acl(cls):
+        return [(Allow, Authenticated, 'list'), (Allow, 'g:admin', ALL_PERMISSIONS), DENY_ALL]
@@ -0,0 +1,58 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+from pyramid_sqlalchemy import Session
+import transaction
+
+from honeygen_pyramid import aggregate
+from honeygen_pyramid.src import User
+from honeygen_pyramid.testing import AppTestCase
+from honeygen_pyramid.tests.models import Account
+
+
+class AggregateTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        aggregate.cache.entries.clear()
+        with transaction.manager:
+            Session.add_all([User(id=1, name='Brendan', age=18), User(id=2, name='John', age=20, best_friend_id=1),
+                             User(id=3, name='Antoine', age=30, best_friend_id=1)])
+
+    def test_total(self):
+        self.assertNotIn('meta', self.app.get('/users').json)
+        self.assertEqual(self.app.get('/users', params={'meta': 'total'}).json['meta'], {'total': 3})
+        response = self.app.get('/users', params={'meta': 'total', 'filter[id]': '1,3'})
+        self.assertEqual(response.json['meta'], {'total': 2})
+
+    def test_aggregate(self):
+        params = {'count': '*', 'avg': 'age', 'max': 'age,name', 'group_by': 'best_friend_id'}
+        with self.assertMaxQueries(1):
+            response = self.app.get('/users/aggregate', params=params)
+        self.assertEqual(response.json['data'], [
+            {'best_friend_id': None, 'count': 1, 'avg_age': 18.0, 'max_age': 18, 'max_name': 'Brendan'},
+            {'best_friend_id': 1, 'count': 2, 'avg_age': 25.0, 'max_age': 30, 'max_name': 'John'},
+        ])
+        self.assertEqual(self.app.get('/users/aggregate?count=*').json['data'], [{'count': 3}])
+
+    def test_invalid_aggregate(self):
+        for query in ('', 'group_by=age', 'avg=password', 'sum=*', 'count=*&group_by=nope'):
+            self.app.get('/users/aggregate?' + query, status=400)
+
+    def test_hidden_columns(self):
+        with transaction.manager:
+            Session.add(Account(id=1, login='brendan', _password='hunter2'))
+        self.app.get('/accounts/aggregate?count=*&group_by=login', status=200)
+        for query in ('max=_password&group_by=id', 'count=*&group_by=_password'):
+            errors = self.app.get('/accounts/aggregate?' + query, status=400).json['errors']
+            self.assertEqual(errors[0]['detail'], 'Unknown column "_password"')
+
+    def test_cache(self):
+        self.app.get('/users/aggregate?count=*')
+        with self.assertMaxQueries(0):
+            self.assertEqual(self.app.get('/users/aggregate?count=*').json['data'], [{'count': 3}])
+        # Writes invalidate the cache, once committed
+        self.app.delete('/users/2')
+        self.assertEqual(self.app.get('/users/aggregate?count=*').json['data'], [{'count': 2}])
+        self.app.post('/users/import', b'{"id": 4, "name": "Paul"}\n', content_type='application/x-ndjson')
+        self.assertEqual(self.app.get('/users/aggregate?count=*').json['data'], [{'count': 3}])
+        self.app.delete('/users')
+        self.assertEqual(self.app.get('/users/aggregate?count=*').json['data'], [{'count': 0}])
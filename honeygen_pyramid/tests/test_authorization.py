@@ -0,0 +1,125 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+from unittest import mock
+
+from pyramid import testing
+from pyramid.security import Allow, Deny, Everyone, Authenticated, ALL_PERMISSIONS, DENY_ALL
+from pyramid_sqlalchemy import Session
+from sqlalchemy import false
+import transaction
+
+from honeygen_pyramid.authorization import CompiledACL
+from honeygen_pyramid.errors import NotFoundException
+from honeygen_pyramid.src import User, Address
+from honeygen_pyramid.testing import AppTestCase, ViewTestCase, call_view
+from honeygen_pyramid.tests.models import Report
+
+
+class CompiledACLTest(unittest.TestCase):
+    def setUp(self):
+        self.acl = CompiledACL([
+            (Deny, 'u:2', ALL_PERMISSIONS),
+            (Allow, Authenticated, ('read', 'list')),
+            (Allow, 'g:admin', ALL_PERMISSIONS),
+            DENY_ALL,
+        ])
+
+    def test_permits(self):
+        self.assertTrue(self.acl.permits((Everyone, Authenticated, 'u:1'), 'read'))
+        self.assertFalse(self.acl.permits((Everyone, Authenticated, 'u:1'), 'delete'))
+        self.assertTrue(self.acl.permits((Everyone, Authenticated, 'u:1', 'g:admin'), 'delete'))
+        self.assertTrue(self.acl.permits((Everyone, Authenticated, 'u:1', 'g:admin'), 'unknown'))
+        self.assertFalse(self.acl.permits((Everyone, Authenticated, 'u:2', 'g:admin'), 'read'))
+        self.assertFalse(self.acl.permits((Everyone,), 'read'))
+
+    def test_principals_allowed_by_permission(self):
+        self.assertEqual(self.acl.principals_allowed_by_permission('read'), {Authenticated, 'g:admin'})
+        self.assertEqual(self.acl.principals_allowed_by_permission('empty'), {'g:admin'})
+
+
+def owned_addresses(cls, user):
+    return cls.owner_id == user['id'] if user else false()
+
+
+class AuthorizationTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        with transaction.manager:
+            Session.add(User(id=1, name='Brendan', age=18))
+            Session.add(Report(id=1, title='Sales'))
+
+    def test_everything_is_allowed_by_default(self):
+        self.app.get('/users', status=200)
+        self.app.get('/users/1', status=200)
+
+    def test_acl(self):
+        # The ACL of Report is compiled when the model is exposed
+        errors = self.app.get('/reports', status=403).json['errors']
+        self.assertEqual(errors[0]['status'], '403')
+        self.app.get('/reports', headers=self.authorization(1), status=200)
+        self.app.get('/reports/1', headers=self.authorization(1), status=403)
+        self.app.delete('/reports/1', headers=self.authorization(1), status=403)
+        self.app.get('/reports/1', headers=self.authorization(1, 'admin'), status=200)
+        self.app.delete('/reports/1', headers=self.authorization(1, 'admin'), status=204)
+
+
+class OwnershipTest(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        Session.add_all([User(id=1, name='Brendan', age=18), User(id=2, name='John', age=19)])
+        Session.add_all([Address(id=1, city='Paris', owner_id=1), Address(id=2, city='Lyon', owner_id=2)])
+        Session.flush()
+        patcher = mock.patch.object(Address, 'hg_owner_filter', classmethod(owned_addresses))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, user_id, **params):
+        request = testing.DummyRequest(params=params)
+        request.user = {'id': user_id, 'groups': []}
+        return request
+
+    def test_list(self):
+        result = call_view(Address, 'list', request=self.request(1))
+        self.assertEqual([address['id'] for address in result['data']], [1])
+        anonymous = testing.DummyRequest()
+        self.assertEqual(call_view(Address, 'list', request=anonymous), {'data': []})
+
+    def test_read(self):
+        self.assertEqual(call_view(Address, 'read', id='1', request=self.request(1))['id'], 1)
+        with self.assertRaises(NotFoundException):
+            call_view(Address, 'read', id='2', request=self.request(1))
+
+    def test_filter_is_in_the_query(self):
+        with self.assertMaxQueries(1) as queries:
+            call_view(Address, 'list', request=self.request(1, **{'filter[id]': '1'}))
+        self.assertIn('owner_id', queries.statements[0][0])
+
+    def test_empty(self):
+        call_view(Address, 'empty', request=self.request(1))
+        self.assertEqual([address.id for address in Session.query(Address)], [2])
+
+
+class OwnershipImportTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        with transaction.manager:
+            Session.add_all([User(id=1, name='Brendan'), User(id=2, name='John')])
+        patcher = mock.patch.object(Address, 'hg_owner_filter', classmethod(owned_addresses))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body, user_id=None, status=200):
+        headers = self.authorization(user_id) if user_id is not None else {}
+        return self.app.post('/addresses/import', body, headers=headers, content_type='application/x-ndjson',
+                             status=status)
+
+    def test_import_own_rows(self):
+        self.post(b'{"city": "Paris", "owner_id": 1}\n{"id": 5, "city": "Lyon", "owner_id": 1}\n', 1)
+        self.assertEqual(sorted(address.owner_id for address in Session.query(Address)), [1, 1])
+
+    def test_import_rows_of_someone_else(self):
+        errors = self.post(b'{"city": "Paris", "owner_id": 1}\n{"city": "Lyon", "owner_id": 2}\n', 1, 403)
+        self.assertEqual(errors.json['errors'][0]['status'], '403')
+        self.post(b'{"city": "Paris", "owner_id": 1}\n', status=403)  # Anonymous users own nothing
+        self.assertEqual(Session.query(Address).count(), 0)
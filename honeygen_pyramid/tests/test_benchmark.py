@@ -0,0 +1,58 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from honeygen_pyramid.scripts import benchmark
+from honeygen_pyramid.scripts.benchmark import compare, percentile, run_benchmark
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 95), 3)
+
+    def test_run_benchmark(self):
+        results = run_benchmark(sizes=[10], iterations=2)
+        scenarios = results['results']['10']
+        self.assertEqual(set(scenarios),
+                         {'list_users', 'get_user', 'get_user_with_relationships', 'delete_user',
+                          'export_users_ndjson', 'export_users_csv', 'import_users_ndjson'})
+        self.assertGreater(scenarios['import_users_ndjson']['rows_per_minute'], 0)
+        for measures in scenarios.values():
+            self.assertGreater(measures['queries'], 0)
+            self.assertGreater(measures['peak_memory'], 0)
+            self.assertLessEqual(measures['p50'], measures['p99'])
+
+    def test_compare(self):
+        baseline = {'results': {'10': {'list_users': {'p50': 10.0, 'p95': 20.0, 'peak_memory': 1000, 'queries': 3}}}}
+        same = {'results': {'10': {'list_users': {'p50': 12.0, 'p95': 20.0, 'peak_memory': 1000, 'queries': 3}}}}
+        self.assertEqual(compare(same, baseline, tolerance=0.5), [])
+        slower = {'results': {'10': {'list_users': {'p50': 16.0, 'p95': 20.0, 'peak_memory': 1000, 'queries': 4}}}}
+        regressions = compare(slower, baseline, tolerance=0.5)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(any('queries' in regression for regression in regressions))
+        self.assertEqual(compare(slower, {'results': {}}), [])
+
+    def test_main_with_the_output_as_baseline(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'results.json')
+        baseline = {'results': {'10': {'list_users': {'p50': 10.0, 'p95': 20.0, 'peak_memory': 1000, 'queries': 3}}}}
+        slower = {'results': {'10': {'list_users': {'p50': 10.0, 'p95': 20.0, 'peak_memory': 1000, 'queries': 4}}}}
+        with open(path, 'w') as f:
+            json.dump(baseline, f)
+        with mock.patch.object(benchmark, 'run_benchmark', return_value=slower), \
+                mock.patch('sys.stdout', io.StringIO()) as out:
+            with self.assertRaises(SystemExit):
+                benchmark.main(['benchmark', '--output', path, '--baseline', path])
+        self.assertIn('REGRESSION', out.getvalue())  # Compared to the previous results, not to the new ones
+        with open(path) as f:
+            self.assertEqual(json.load(f), slower)
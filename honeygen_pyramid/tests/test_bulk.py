@@ -0,0 +1,118 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import decimal
+import io
+import json
+import unittest
+
+from pyramid_sqlalchemy import Session
+from sqlalchemy import Boolean, Column, Numeric
+import transaction
+
+from honeygen_pyramid import bulk
+from honeygen_pyramid.src import User, Address
+from honeygen_pyramid.testing import AppTestCase
+from honeygen_pyramid.tests.models import Account
+
+
+class BulkTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        with transaction.manager:
+            Session.add_all([User(id=1, name='Brendan', age=18), User(id=2, name='John, Jr.', best_friend_id=1)])
+
+    def test_export_ndjson(self):
+        response = self.app.get('/users/export')
+        self.assertEqual(response.content_type, 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in response.text.splitlines()], [
+            {'id': 1, 'name': 'Brendan', 'age': 18, 'best_friend_id': None},
+            {'id': 2, 'name': 'John, Jr.', 'age': None, 'best_friend_id': 1},
+        ])
+
+    def test_export_csv(self):
+        response = self.app.get('/users/export', params={'format': 'csv'})
+        self.assertEqual(response.content_type, 'text/csv')
+        self.assertEqual(response.text.splitlines(),
+                         ['id,name,age,best_friend_id', '1,Brendan,18,', '2,"John, Jr.",,1'])
+
+    def test_round_trip(self):
+        for format in ('ndjson', 'csv'):
+            exported = self.app.get('/users/export', params={'format': format}).body
+            self.app.delete('/users', status=204)
+            response = self.app.post('/users/import?format=' + format, exported,
+                                     content_type=bulk.FORMATS[format])
+            self.assertEqual(response.json, {'meta': {'imported': 2}})
+            self.assertEqual(self.app.get('/users/export', params={'format': format}).body, exported)
+
+    def test_import_by_batches(self):
+        body = ''.join(json.dumps({'name': 'User {}'.format(id), 'age': id}) + '\n' for id in range(25))
+        original_size, bulk.BATCH_SIZE = bulk.BATCH_SIZE, 10
+        try:
+            self.app.post('/users/import', body.encode('utf-8'), content_type='application/x-ndjson')
+        finally:
+            bulk.BATCH_SIZE = original_size
+        self.assertEqual(Session.query(User).count(), 27)
+        # Imported users are in the change feed
+        changes = self.app.get('/users/changes', params={'since': 2}).json['data']
+        self.assertEqual(len(changes), 25)
+
+    def test_invalid_import(self):
+        self.app.post('/users/import?format=xml', b'', status=400)
+        body = b'{"name": "Antoine"}\n{"nickname": "Toto"}\n'
+        errors = self.app.post('/users/import', body, status=400).json['errors']
+        self.assertIn('nickname', errors[0]['detail'])
+        self.app.post('/users/import?format=csv', b'id,age\n3,old\n', status=400)
+        self.assertEqual(Session.query(User).count(), 2)  # Nothing was imported
+
+    def test_import_checks_json_types(self):
+        for record in ({'id': 10, 'name': 5}, {'id': 10, 'age': 'old'}, {'id': 10, 'age': 18.5},
+                       {'id': 10, 'age': True}, {'id': '10'}):
+            body = (json.dumps(record) + '\n').encode('utf-8')
+            errors = self.app.post('/users/import', body, status=400).json['errors']
+            self.assertIn('Invalid value in record 1', errors[0]['detail'])
+        self.assertEqual(Session.query(User).count(), 2)
+
+    def test_import_existing_identifier(self):
+        body = b'{"id": 3, "name": "Antoine"}\n{"id": 1, "name": "Brendan"}\n'
+        errors = self.app.post('/users/import', body, content_type='application/x-ndjson', status=400).json['errors']
+        self.assertIn('UNIQUE', errors[0]['detail'])
+        self.assertEqual(Session.query(User).count(), 2)
+
+    def test_export_of_addresses(self):
+        with transaction.manager:
+            Session.add(Address(id=1, city='Paris', owner_id=1))
+        self.assertEqual(self.app.get('/addresses/export', params={'format': 'csv'}).text.splitlines(),
+                         ['id,city,owner_id', '1,Paris,1'])
+
+    def test_hidden_columns(self):
+        with transaction.manager:
+            Session.add(Account(id=1, login='brendan', _password='hunter2'))
+        self.assertEqual(self.app.get('/accounts/export', params={'format': 'csv'}).text.splitlines(),
+                         ['id,login', '1,brendan'])
+        body = b'{"id": 2, "login": "john", "_password": "letmein"}\n'
+        errors = self.app.post('/accounts/import', body, status=400).json['errors']
+        self.assertIn('_password', errors[0]['detail'])
+        self.assertEqual(Session.query(Account).count(), 1)
+
+    def test_import_validates_the_rows(self):
+        body = b'{"id": 1, "login": "brendan"}\n{"id": 2, "login": ""}\n'
+        errors = self.app.post('/accounts/import', body, status=400).json['errors']
+        self.assertEqual(errors[0]['detail'], 'The login of an account cannot be empty')
+        self.assertEqual(Session.query(Account).count(), 0)
+
+
+class ConverterTest(unittest.TestCase):
+    def test_booleans(self):
+        from_json, from_text = bulk._converter(Column(Boolean), False), bulk._converter(Column(Boolean), True)
+        self.assertIs(from_json(False), False)
+        self.assertRaises(TypeError, from_json, 'false')
+        self.assertEqual([from_text(value) for value in ('true', 'No', '0', '')], [True, False, False, None])
+        self.assertRaises(ValueError, from_text, 'maybe')
+
+    def test_decimals(self):
+        from_json = bulk._converter(Column(Numeric), False)
+        self.assertEqual(from_json(0.1), decimal.Decimal('0.1'))
+        self.assertEqual(from_json('2.50'), decimal.Decimal('2.50'))
+        self.assertRaises(TypeError, from_json, [1])
+        records = bulk.parse(io.BytesIO(b'amount\nmuch\n'), 'csv', [Column('amount', Numeric)])
+        self.assertRaises(bulk.BulkFormatError, list, records)
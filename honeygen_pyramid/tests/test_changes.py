@@ -0,0 +1,100 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+from unittest import mock
+
+from pyramid_sqlalchemy import Session
+from sqlalchemy import false
+import transaction
+from zope.sqlalchemy import mark_changed
+
+from honeygen_pyramid import changes
+from honeygen_pyramid.src import User, Address
+from honeygen_pyramid.testing import AppTestCase, QueryRecorder
+
+
+class ChangesTest(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        with transaction.manager:
+            Session.add_all([User(id=1, name='Brendan', age=18), User(id=2, name='John', age=19)])
+            Session.add(Address(id=1, city='Paris', owner_id=1))  # Addresses are not tracked
+
+    def operations(self, since=0):
+        response = self.app.get('/users/changes', params={'since': since}).json
+        return [(change['id'], change['meta']['operation']) for change in response['data']], response['meta']
+
+    def test_changes(self):
+        operations, meta = self.operations()
+        self.assertEqual(operations, [(1, 'insert'), (2, 'insert')])
+        self.assertEqual(meta, {'cursor': 2, 'reset': False, 'more': False})
+
+        with transaction.manager:
+            john = Session.query(User).get(2)
+            john.age = 20
+            john.hg_save()
+        self.app.delete('/users/2', status=204)
+        operations, meta = self.operations(since=2)
+        self.assertEqual(operations, [(2, 'update'), (2, 'delete')])
+
+        self.app.delete('/users', status=204)
+        operations, meta = self.operations(since=meta['cursor'])
+        self.assertEqual(operations, [(None, 'empty')])
+        self.assertEqual(self.operations(since=meta['cursor'])[0], [])
+
+    def test_changes_are_appended_when_committed(self):
+        with QueryRecorder() as recorder:
+            with transaction.manager:
+                Session.add(User(id=3, name='Antoine'))
+                Session.flush()
+                self.assertEqual(changes.get_cursor('user'), 2)  # No cursor is assigned before the commit
+        self.assertEqual(changes.get_cursor('user'), 3)
+        statements = [statement.split()[:3] for statement, _ in recorder.statements]
+        # The log is locked until the commit, before the cursor is assigned
+        self.assertLess(statements.index(['UPDATE', 'hg_changes_lock', 'SET']),
+                        statements.index(['INSERT', 'INTO', 'hg_changes']))
+
+        with transaction.manager:
+            Session.add(User(id=4, name='Julie'))
+            Session.flush()
+            transaction.abort()
+        self.assertEqual(changes.get_cursor('user'), 3)
+        self.assertNotIn('hg_recorded_changes', Session().info)
+
+    def test_invalid_limit(self):
+        for limit in ('0', '-1'):
+            self.app.get('/users/changes', params={'limit': limit}, status=400)
+        response = self.app.get('/users/changes', params={'limit': '1'}).json
+        self.assertEqual((len(response['data']), response['meta']['more']), (1, True))
+
+    def test_changes_with_an_owner_filter(self):
+        def own_user(cls, user):
+            if user and 'admin' in [group['name'] for group in user['groups']]:
+                return None
+            return cls.id == user['id'] if user else false()
+
+        with mock.patch.object(User, 'hg_owner_filter', classmethod(own_user)):
+            self.app.get('/users/changes', status=403)
+            errors = self.app.get('/users/changes', headers=self.authorization(1), status=403).json['errors']
+            self.assertEqual(errors[0]['status'], '403')
+            response = self.app.get('/users/changes', headers=self.authorization(1, 'admin')).json
+            self.assertEqual(len(response['data']), 2)
+
+    def test_changes_of_untracked_models(self):
+        self.app.get('/addresses/changes', status=404)
+
+    def test_compaction(self):
+        with transaction.manager:
+            for age in range(3):
+                Session.query(User).get(1).age = age
+                Session.flush()
+        with transaction.manager:
+            changes.compact(Session.connection(), 'user', retention=1)
+            mark_changed(Session())
+        # Only the last change of each user is kept, and the oldest one is marked as compacted
+        operations, meta = self.operations(since=0)
+        self.assertEqual(operations, [])
+        self.assertTrue(meta['reset'])
+        operations, meta = self.operations(since=meta['cursor'] - 1)
+        self.assertEqual(operations, [(1, 'update')])
+        self.assertFalse(meta['reset'])
+        self.app.get('/users/changes', params={'since': 'yesterday'}, status=400)
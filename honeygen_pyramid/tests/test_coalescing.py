@@ -0,0 +1,164 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pyramid import testing
+from pyramid.response import Response
+
+from pyramid.interfaces import ITweens
+from pyramid.request import Request
+from pyramid_sqlalchemy import Session
+import transaction
+
+from honeygen_pyramid import coalescing
+from honeygen_pyramid.base_view import ItemView
+from honeygen_pyramid.src import User
+from honeygen_pyramid.testing import AppTestCase
+
+
+class WaitedEvent(threading.Event):
+    """
+    An event that releases a semaphore each time a thread waits for it
+    """
+
+    def __init__(self, arrived):
+        super().__init__()
+        self.arrived = arrived
+
+    def wait(self, timeout=None):
+        self.arrived.release()
+        return super().wait(timeout)
+
+
+class CoalescingTweenTest(unittest.TestCase):
+    def setUp(self):
+        self.config = testing.setUp()
+        self.calls = 0
+        self.arrived = threading.Semaphore(0)  # Released by each request, once it is handled or waiting
+        self.release = threading.Event()
+
+        new_flight = coalescing.Flight
+
+        def flight():
+            flight = new_flight()
+            flight.done = WaitedEvent(self.arrived)  # So the requests that follow the first one are seen
+            return flight
+
+        patcher = mock.patch.object(coalescing, 'Flight', flight)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def handler(self, request):
+        self.calls += 1
+        self.arrived.release()
+        self.release.wait(5)
+        if request.path_info == '/users/export':
+            return Response(app_iter=iter([b'streamed']))
+        return Response(json_body={'data': self.calls}, status=200)
+
+    def request(self, path, principals=('system.Everyone',)):
+        request = testing.DummyRequest(path=path)
+        request.principals = principals
+        return request
+
+    def run_concurrently(self, tween, requests):
+        """
+        Run the first request, then the others while it is handled
+        :return: the responses
+        """
+        responses = [None] * len(requests)
+
+        def run(index):
+            responses[index] = tween(requests[index])
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(len(requests))]
+        threads[0].start()
+        self.assertTrue(self.arrived.acquire(timeout=5))
+        for thread in threads[1:]:
+            thread.start()
+        # Wait for every request to either follow the first one, or be handled
+        for _ in threads[1:]:
+            self.assertTrue(self.arrived.acquire(timeout=5))
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return responses
+
+    def make_tween(self):
+        return coalescing.coalescing_tween_factory(self.handler, self.config.registry)
+
+    def test_identical_reads_are_coalesced(self):
+        tween = self.make_tween()
+        responses = self.run_concurrently(tween, [self.request('/users/1') for _ in range(4)])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([response.json_body for response in responses], [{'data': 1}] * 4)
+        self.assertEqual(len({id(response) for response in responses}), 4)  # Each request has its own response
+
+    def test_different_principals_are_not_coalesced(self):
+        tween = self.make_tween()
+        self.run_concurrently(tween, [self.request('/users/1'), self.request('/users/1', ('system.Everyone', 'u:1'))])
+        self.assertEqual(self.calls, 2)
+
+    def test_streamed_responses_are_not_shared(self):
+        tween = self.make_tween()
+        self.run_concurrently(tween, [self.request('/users/export') for _ in range(2)])
+        self.assertEqual(self.calls, 2)
+
+    def test_rate_limited_responses_are_not_shared(self):
+        tween = coalescing.coalescing_tween_factory(lambda request: Response(status=429), self.config.registry)
+        self.assertIsNone(coalescing.freeze(tween(self.request('/users/1'))))
+
+
+class CoalescingAppTest(AppTestCase):
+    def setUp(self):
+        # The requests run in several threads, which cannot share an in-memory database
+        self.directory = tempfile.mkdtemp()
+        self.settings = {'ratelimit.rate': '0.01', 'ratelimit.burst': '1',
+                         'sqlalchemy.url': 'sqlite:///' + os.path.join(self.directory, 'test.sqlite')}
+        super().setUp()
+        with transaction.manager:
+            Session.add(User(id=1, name='Brendan'))
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.directory)
+
+    def get(self, ip):
+        return Request.blank('/users/1', remote_addr=ip).get_response(self.app.app)
+
+    def test_tween_is_under_the_rate_limit(self):
+        tweens = [name for name, _ in self.app.app.registry.queryUtility(ITweens).implicit()]
+        self.assertLess(tweens.index('honeygen_pyramid.ratelimit.rate_limit_tween_factory'),
+                        tweens.index('honeygen_pyramid.coalescing.coalescing_tween_factory'))
+
+    def test_followers_are_rate_limited(self):
+        self.assertEqual(self.get('10.0.0.2').status_code, 200)  # The only token of 10.0.0.2
+        entered, release = threading.Event(), threading.Event()
+        read = ItemView.read
+
+        def slow_read(view):
+            entered.set()
+            release.wait(5)
+            return read(view)
+
+        responses = {}
+        with mock.patch.object(ItemView, 'read', slow_read):
+            leader = threading.Thread(target=lambda: responses.setdefault('leader', self.get('10.0.0.1')))
+            leader.start()
+            entered.wait(5)
+            # 10.0.0.2 has the same principals as the leader, but no token left
+            responses['follower'] = self.get('10.0.0.2')
+            release.set()
+            leader.join(5)
+        self.assertEqual(responses['leader'].status_code, 200)
+        self.assertEqual(responses['follower'].status_code, 429)
+        # The 429 of 10.0.0.2 is not shared with the other anonymous clients
+        self.assertEqual(self.get('10.0.0.3').status_code, 200)
@@ -0,0 +1,105 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import gzip
+import json
+import unittest
+from unittest import mock
+
+from pyramid import testing
+from pyramid.request import Request
+from pyramid.response import Response
+from pyramid_sqlalchemy import Session
+import transaction
+
+from honeygen_pyramid import compression
+from honeygen_pyramid.src import User
+from honeygen_pyramid.testing import AppTestCase
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+class CompressionTest(AppTestCase):
+    settings = {'compression.min_size': '500'}
+
+    def setUp(self):
+        super().setUp()
+        with transaction.manager:
+            Session.add_all([User(id=id, name='User {}'.format(id), age=id) for id in range(1, 21)])
+
+    def get(self, path, headers=None):
+        # WebTest decodes the responses, so the application is called directly
+        return Request.blank(path, headers=headers).get_response(self.app.app)
+
+    def test_compressed(self):
+        response = self.get('/users', headers=GZIP)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.body).decode('utf-8'))['data']), 20)
+
+    def test_not_accepted(self):
+        self.assertNotIn('Content-Encoding', self.get('/users').headers)
+        self.assertNotIn('Content-Encoding', self.get('/users', headers={'Accept-Encoding': 'gzip;q=0'}).headers)
+
+    def test_below_threshold(self):
+        response = self.get('/users/1', headers=GZIP)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.json['id'], 1)
+
+    def test_compressed_bodies_are_cached(self):
+        with mock.patch.object(compression.GzipEncoder, 'compress', autospec=True,
+                               side_effect=lambda encoder, body: gzip.compress(body)) as compress:
+            first = self.get('/users', headers=GZIP)
+            second = self.get('/users', headers=GZIP)
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.body, second.body)
+
+
+class StreamCompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.config = testing.setUp(settings={'compression.min_size': '1000000'})
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_streamed_response(self):
+        chunks = [b'{"id": 1}\n'] * 100
+
+        def handler(request):
+            return Response(app_iter=iter(chunks), content_type='application/x-ndjson')
+
+        tween = compression.compression_tween_factory(handler, self.config.registry)
+        request = testing.DummyRequest(headers=GZIP)
+        response = tween(request)
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.app_iter)), b''.join(chunks))
+
+    def test_unstarted_streamed_response_is_closed(self):
+        body = mock.MagicMock()
+        body.__iter__.return_value = iter([b'{"id": 1}\n'])
+        tween = compression.compression_tween_factory(
+            lambda request: Response(app_iter=body, content_type='application/x-ndjson'), self.config.registry)
+        response = tween(testing.DummyRequest(headers=GZIP))
+        response.app_iter.close()  # The client went away before the first chunk
+        body.close.assert_called_once_with()
+
+    def test_negotiate(self):
+        encoders = [compression.BrotliEncoder(5), compression.GzipEncoder(6)]
+        self.assertIsNone(compression.negotiate('identity', encoders))
+        self.assertEqual(compression.negotiate('gzip, br', encoders).name, 'br')
+        self.assertEqual(compression.negotiate('gzip;q=1.0, br;q=0.5', encoders).name, 'gzip')
+        self.assertEqual(compression.negotiate('*', encoders[1:]).name, 'gzip')
+
+    def test_brotli_quality(self):
+        self.config.registry.settings.update({'compression.brotli_quality': '4', 'compression.min_size': '0'})
+        brotli = mock.Mock()
+        brotli.compress.return_value = b'compressed'
+        with mock.patch.object(compression, 'brotli', brotli):
+            tween = compression.compression_tween_factory(
+                lambda request: Response(body=b'{"id": 1}', content_type='application/json'), self.config.registry)
+            tween(testing.DummyRequest(headers={'Accept-Encoding': 'br'}))
+            tween = compression.compression_tween_factory(
+                lambda request: Response(app_iter=iter([b'{"id": 1}\n']), content_type='application/x-ndjson'),
+                self.config.registry)
+            tween(testing.DummyRequest(headers={'Accept-Encoding': 'br'}))
+        brotli.compress.assert_called_once_with(b'{"id": 1}', mode=brotli.MODE_TEXT, quality=4)
+        brotli.Compressor.assert_called_once_with(mode=brotli.MODE_TEXT, quality=4)
@@ -0,0 +1,57 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+from pyramid_sqlalchemy import Session
+
+from honeygen_pyramid.introspector import Attribute, Model, Relationship, SQLAlchemyModel
+from honeygen_pyramid.serializer import JSONAPISerializer
+from honeygen_pyramid.src import User, Address
+from honeygen_pyramid.testing import ViewTestCase
+
+
+class SQLAlchemyModelTest(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        Session.add_all([User(id=1, name='Brendan', age=18), User(id=2, name='John', age=19, best_friend_id=1)])
+        Session.add(Address(city='Paris', owner_id=1))
+        Session.flush()
+
+    def test_models_are_compact(self):
+        brendan, john = [SQLAlchemyModel(Session.query(User).get(id)) for id in (1, 2)]
+        self.assertFalse(hasattr(brendan, '__dict__'))
+        self.assertFalse(hasattr(Attribute('name', 'value'), '__dict__'))
+        self.assertFalse(hasattr(Relationship('name', 1, 'user'), '__dict__'))
+        self.assertIs(brendan.attribute_names, john.attribute_names)
+        self.assertEqual(brendan.attribute_names, ('name', 'age'))
+        self.assertEqual(brendan.attribute_values, ('Brendan', 18))
+
+    def test_models_built_from_attributes(self):
+        friend = Relationship('best_friend', 2, 'user')
+        source = User(id=1, name='Brendan', age=18)
+        model = Model([Attribute('name', 'Brendan', 'Text'), Attribute('age', 18)], [friend], 'user', source)
+        self.assertEqual([(attribute.name, attribute.value, attribute.type) for attribute in model.attributes],
+                         [('name', 'Brendan', 'Text'), ('age', 18, None)])
+        self.assertEqual((model.attribute_names, model.attribute_values), (('name', 'age'), ('Brendan', 18)))
+        self.assertEqual(model.relationships, [friend])
+
+        compact = Model.from_values(('name', 'age'), ('Brendan', 18), [friend], 'user', source)
+        self.assertEqual([(attribute.name, attribute.value) for attribute in compact.attributes],
+                         [('name', 'Brendan'), ('age', 18)])
+        self.assertEqual(JSONAPISerializer().serialize(model), JSONAPISerializer().serialize(compact))
+
+    def test_attributes_and_relationships(self):
+        brendan = SQLAlchemyModel(Session.query(User).get(1))
+        self.assertEqual([(attribute.name, attribute.value) for attribute in brendan.attributes],
+                         [('name', 'Brendan'), ('age', 18)])
+        relationships = {relationship.name: relationship for relationship in brendan.relationships}
+        self.assertEqual(relationships['best_friend'].value, 2)
+        self.assertEqual(relationships['addresses'].value, [1])
+        self.assertTrue(relationships['addresses'].to_many)
+
+    def test_custom_attribute_serialization(self):
+        class UpperCaseSerializer(JSONAPISerializer):
+            def serialize_attribute(self, attribute):
+                return attribute.value.upper() if isinstance(attribute.value, str) else attribute.value
+
+        brendan = SQLAlchemyModel(Session.query(User).get(1))
+        self.assertEqual(UpperCaseSerializer()._serialize_attributes(brendan), {'name': 'BRENDAN', 'age': 18})
+        self.assertEqual(JSONAPISerializer()._serialize_attributes(brendan), {'name': 'Brendan', 'age': 18})
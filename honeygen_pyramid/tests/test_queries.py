@@ -0,0 +1,40 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+from pyramid_sqlalchemy import Session
+
+from honeygen_pyramid.src import User, Address
+from honeygen_pyramid.testing import ViewTestCase, call_view
+
+USERS = 50
+
+
+class ViewQueriesTest(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        Session.add_all([User(id=id, name='User {}'.format(id), age=id, best_friend_id=id - 1 or None)
+                         for id in range(1, USERS + 1)])
+        Session.add_all([Address(city='Paris', owner_id=1) for _ in range(10)])
+        Session.flush()
+        Session.expunge_all()
+
+    def test_read(self):
+        with self.assertMaxQueries(3):
+            result = call_view(User, 'read', id=1)
+        self.assertEqual(len(result['data']['relationships']['addresses']['data']), 10)
+
+    def test_list(self):
+        with self.assertMaxQueries(1):
+            result = call_view(User, 'list')
+        self.assertEqual(len(result['data']), USERS)
+
+    def test_list_memory(self):
+        with self.assertMaxMemory(256 * 1024):
+            call_view(User, 'list')
+
+    def test_assertions_fail_above_the_bounds(self):
+        with self.assertRaises(AssertionError):
+            with self.assertMaxQueries(1):
+                call_view(User, 'read', id=1)
+        with self.assertRaises(AssertionError):
+            with self.assertMaxMemory(1):
+                call_view(User, 'read', id=1)
@@ -0,0 +1,122 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+
+from pyramid import testing
+from pyramid.response import Response
+from pyramid_sqlalchemy import Session
+import transaction
+
+from honeygen_pyramid import ratelimit
+from honeygen_pyramid.errors import TooManyRequestsException
+from honeygen_pyramid.src import User
+from honeygen_pyramid.testing import AppTestCase
+
+
+class TokenBucketsTest(unittest.TestCase):
+    def test_take(self):
+        buckets = ratelimit.TokenBuckets(rate=2, burst=3)
+        self.assertEqual([buckets.take('a', now=10) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(buckets.take('a', now=10), 0.5)
+        self.assertEqual(buckets.take('b', now=10), 0)  # Each client has its own bucket
+        self.assertEqual(buckets.take('a', now=10.5), 0)
+
+    def test_sweep(self):
+        buckets = ratelimit.TokenBuckets(rate=2, burst=3)
+        buckets.take('a', now=10)
+        buckets.take('b', now=11)
+        buckets.sweep(now=12)
+        self.assertEqual(set(buckets.values), {'b'})  # The bucket of "a" is full again
+
+
+class RateLimitTweenTest(unittest.TestCase):
+    def setUp(self):
+        self.config = testing.setUp(settings={'ratelimit.max_concurrent_per_client': '1'})
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def request(self, path, method='GET'):
+        request = testing.DummyRequest(path=path)
+        request.method = method
+        request.user = {'id': 1}
+        request.remote_addr = '127.0.0.1'
+        return request
+
+    def test_concurrent_expensive_actions(self):
+        def handler(request):
+            if request.path_info == '/users':
+                with self.assertRaises(TooManyRequestsException):
+                    tween(self.request('/users/export'))
+                tween(self.request('/users/1'))  # Cheap actions are not limited
+            return Response()
+
+        tween = ratelimit.rate_limit_tween_factory(handler, self.config.registry)
+        tween(self.request('/users'))
+        tween(self.request('/users', method='DELETE'))  # The slot was released
+
+    def test_concurrent_head_requests(self):
+        def handler(request):
+            if request.path_info == '/users':
+                with self.assertRaises(TooManyRequestsException):
+                    tween(self.request('/users', method='HEAD'))  # As expensive as GET
+            return Response()
+
+        tween = ratelimit.rate_limit_tween_factory(handler, self.config.registry)
+        tween(self.request('/users', method='HEAD'))
+        collections = {'users': User}
+        self.assertEqual(ratelimit.get_action(self.request('/users', 'HEAD'), collections), (User, 'list'))
+        self.assertEqual(ratelimit.get_action(self.request('/users/1', 'HEAD'), collections), (User, 'read'))
+
+    def test_streamed_response(self):
+        response = Response(app_iter=iter([b'a', b'b']))
+        tween = ratelimit.rate_limit_tween_factory(lambda request: response, self.config.registry)
+        tween(self.request('/users/export'))
+        with self.assertRaises(TooManyRequestsException):
+            tween(self.request('/users/export'))  # The first body is not sent yet
+        self.assertEqual(b''.join(response.app_iter), b'ab')
+        response.app_iter.close()  # As WSGI servers do once the body is sent
+        tween(self.request('/users/export'))
+
+    def test_unstarted_streamed_response(self):
+        response = Response(app_iter=iter([b'a']))
+        tween = ratelimit.rate_limit_tween_factory(lambda request: response, self.config.registry)
+        tween(self.request('/users/export'))
+        response.app_iter.close()  # The client went away before the first chunk
+        tween(self.request('/users/export'))
+        response.app_iter.close()
+        response.app_iter.close()  # Closing twice only releases once
+        tween(self.request('/users/export'))
+
+    def test_get_action(self):
+        collections = {'users': User}
+        self.assertEqual(ratelimit.get_action(self.request('/users/aggregate'), collections), (User, 'aggregate'))
+        self.assertEqual(ratelimit.get_action(self.request('/users/2', 'DELETE'), collections), (User, 'delete'))
+        self.assertEqual(ratelimit.get_action(self.request('/nothing'), collections), (None, None))
+
+
+class ConcurrencyLimitTest(AppTestCase):
+    settings = {'ratelimit.max_concurrent_per_client': '2'}
+
+    def test_head_releases_its_slot(self):
+        for _ in range(3):
+            self.app.head('/users/export')
+        self.app.get('/users/export')
+
+
+class RateLimitTest(AppTestCase):
+    settings = {'ratelimit.rate': '0.01', 'ratelimit.burst': '2'}
+
+    def setUp(self):
+        super().setUp()
+        with transaction.manager:
+            Session.add(User(id=1, name='Brendan'))
+
+    def test_rate_limit(self):
+        self.app.get('/users/1')
+        self.app.get('/users')
+        response = self.app.get('/users/1', status=429)
+        self.assertEqual(response.headers['Retry-After'], '100')
+        self.assertEqual(response.json['errors'][0]['status'], '429')
+        # Authenticated users are limited separately from their IP
+        self.app.get('/users/1', headers=self.authorization(1))
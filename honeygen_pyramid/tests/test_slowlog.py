@@ -0,0 +1,114 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from pyramid_sqlalchemy import Session
+from sqlalchemy import bindparam, select
+from sqlalchemy.exc import OperationalError, StatementError
+import transaction
+
+from honeygen_pyramid.scripts import slowlog_report
+from honeygen_pyramid.src import User
+from honeygen_pyramid.testing import AppTestCase
+
+
+class SlowLogTest(AppTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'slowlog.jsonl')
+        self.settings = {'slowlog.path': self.path, 'slowlog.query_threshold': '0', 'slowlog.request_threshold': '0'}
+        super().setUp()
+        with transaction.manager:
+            Session.add_all([User(id=1, name='Brendan', age=18), User(id=2, name='John', best_friend_id=1)])
+        self.slow_log = self.app.app.handle_request.slow_log
+        self.slow_log.handler.close()
+        os.remove(self.path)  # Only keep the entries of the requests
+
+    def tearDown(self):
+        self.slow_log.close()
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def read_entries(self):
+        self.slow_log.handler.flush()
+        return list(slowlog_report.read_entries(self.path, 0))
+
+    def test_log(self):
+        self.app.get('/users/1')
+        entries = self.read_entries()
+        queries = [entry for entry in entries if entry['type'] == 'query']
+        requests = [entry for entry in entries if entry['type'] == 'request']
+        self.assertEqual(len(requests), 1)
+        self.assertEqual((requests[0]['model'], requests[0]['action'], requests[0]['status']), ('user', 'read', 200))
+        self.assertEqual(requests[0]['queries'], len(queries))
+        # The item is loaded while traversing the resources
+        query = next(query for query in queries if query['statement'].startswith('SELECT'))
+        self.assertEqual((query['model'], query['action'], query['path']), ('user', 'read', '/users/1'))
+        self.assertEqual(query['parameters'], ['1'])  # The identifier comes from the URL
+        self.assertTrue(any('users' in ' '.join(str(value) for value in row) for row in query['plan']))
+
+    def test_streamed_response(self):
+        self.app.get('/users/export')
+        entries = self.read_entries()
+        requests = [entry for entry in entries if entry['type'] == 'request']
+        self.assertEqual(len(requests), 1)
+        # The rows are read while the body is sent, after the view returned
+        query = next(entry for entry in entries if entry['type'] == 'query' and 'FROM users' in entry['statement'])
+        self.assertEqual((query['model'], query['action'], query['path']), ('user', 'export', '/users/export'))
+        self.assertEqual((requests[0]['action'], requests[0]['queries']), ('export', 1))
+
+    def test_report(self):
+        self.app.get('/users')
+        self.app.get('/users')
+        self.app.get('/users/aggregate?count=*')
+        endpoints, statements = slowlog_report.summarize(self.read_entries())
+        self.assertEqual(sorted((endpoint['action'], endpoint['count']) for endpoint in endpoints),
+                         [('aggregate', 1), ('list', 2)])
+        list_statement = next(statement for statement in statements if 'FROM users' in statement['statement']
+                              and 'count' not in statement['statement'])
+        self.assertEqual((list_statement['count'], list_statement['endpoints']), (2, ['user list']))
+
+        out = io.StringIO()
+        slowlog_report.print_report(endpoints, statements, top=10, out=out)
+        self.assertIn('Slow queries, by statement', out.getvalue())
+        self.assertIn('plan: ', out.getvalue())
+
+    def test_plans_are_only_asked_for_reads(self):
+        self.app.delete('/users/2')
+        queries = [entry for entry in self.read_entries() if entry['type'] == 'query']
+        self.assertTrue([query for query in queries if query['statement'].startswith('DELETE')])
+        for query in queries:
+            self.assertEqual(query['plan'] is not None, query['statement'].startswith('SELECT'))
+
+    def test_failed_queries_are_forgotten(self):
+        with self.engine.connect() as connection:
+            connection.execute('SELECT 1')
+            with self.assertRaises(OperationalError):
+                connection.execute('SELECT * FROM nothing')
+            self.assertEqual(connection.info['hg_query_start'], [])
+            # Fails before being started, because a parameter is missing: the start of the others is kept
+            start = (object(), 0)
+            connection.info['hg_query_start'].append(start)
+            with self.assertRaises(StatementError):
+                connection.execute(select([User.id]).where(User.id == bindparam('id')))
+            self.assertEqual(connection.info['hg_query_start'], [start])
+
+    def test_failed_plans_are_rolled_back(self):
+        def execute(statement, *args):
+            if statement.startswith('EXPLAIN'):
+                raise Exception('syntax error')
+
+        cursor = mock.Mock()
+        cursor.execute.side_effect = execute
+        conn = mock.Mock()
+        conn.dialect.name = 'postgresql'
+        conn.connection.cursor.return_value = cursor
+        plan = self.slow_log.get_plan(conn, 'SELECT 1', ())
+        self.assertEqual(plan, ['Cannot explain the query: syntax error'])
+        self.assertEqual([call[0][0] for call in cursor.execute.call_args_list],
+                         ['SAVEPOINT hg_explain', 'EXPLAIN SELECT 1', 'ROLLBACK TO SAVEPOINT hg_explain'])
+        cursor.close.assert_called_once_with()
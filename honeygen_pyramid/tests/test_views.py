@@ -0,0 +1,93 @@
+from __future__ import absolute_import, print_function, unicode_literals
+
+from unittest import mock
+
+from pyramid import testing
+from pyramid_sqlalchemy import Session
+
+from honeygen_pyramid.errors import MultipleNotFoundException, exception_view
+from honeygen_pyramid.introspector import SQLAlchemyModel, SQLAlchemyRowModel
+from honeygen_pyramid.serializer import ComputedAttribute, JSONAPISerializer
+from honeygen_pyramid.src import User, Address
+from honeygen_pyramid.testing import QueryRecorder, ViewTestCase, call_view
+
+
+class UppercaseNameSerializer(JSONAPISerializer):
+    hidden = ['age']
+
+    @ComputedAttribute('Text', 'uppercase_name')
+    def uppercase(self, model):
+        return model.source.name.upper()
+
+
+class CollectionViewTest(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        Session.add_all([User(id=1, name='Brendan', age=18), User(id=2, name='John', age=19, best_friend_id=1)])
+        Session.add(Address(city='Paris', owner_id=1))
+        Session.flush()
+        Session.expunge_all()
+
+    def test_list_does_not_load_entities(self):
+        with self.assertMaxQueries(1):
+            result = call_view(User, 'list')
+        self.assertEqual(len(Session.identity_map), 0)
+        self.assertEqual(result, {'data': [
+            {'type': 'users', 'id': 1, 'attributes': {'name': 'Brendan', 'age': 18}},
+            {'type': 'users', 'id': 2, 'attributes': {'name': 'John', 'age': 19}},
+        ]})
+
+    def test_list_with_computed_attributes(self):
+        with mock.patch.object(User, 'hg_get_serializer', return_value=UppercaseNameSerializer):
+            result = call_view(User, 'list')
+        self.assertEqual([user['attributes'] for user in result['data']],
+                         [{'name': 'Brendan', 'uppercase_name': 'BRENDAN'}, {'name': 'John', 'uppercase_name': 'JOHN'}])
+
+    def test_computed_attributes_are_not_shared(self):
+        serializer = UppercaseNameSerializer()
+        brendan, john = (SQLAlchemyModel(user) for user in Session.query(User).order_by(User.id))
+        brendan_attributes = serializer.get_attributes(brendan)
+        serializer.get_attributes(john)  # As another request would, at the same time
+        self.assertEqual({attribute.name: attribute.value for attribute in brendan_attributes},
+                         {'name': 'Brendan', 'uppercase_name': 'BRENDAN'})
+
+    def test_row_relationships(self):
+        addresses = list(SQLAlchemyRowModel.from_rows(Address, Session.execute(SQLAlchemyRowModel.select(Address))))
+        self.assertEqual(len(addresses), 1)
+        self.assertEqual(addresses[0].id, 1)
+        self.assertEqual(addresses[0].attribute_values, ('Paris',))
+        self.assertEqual([(relationship.name, relationship.type, relationship.value)
+                          for relationship in addresses[0].relationships], [('owner', 'user', 1)])
+
+    def test_list_by_ids(self):
+        Session.query(User).get(2)  # Already in the session, so it is not queried again
+        request = testing.DummyRequest(params={'filter[id]': '2,1'})
+        with self.assertMaxQueries(1):
+            result = call_view(User, 'list', request=request)
+        self.assertEqual([user['id'] for user in result['data']], [2, 1])
+
+    def test_list_by_many_ids(self):
+        Session.add_all([User(id=id, name='User {}'.format(id)) for id in range(3, 8)])
+        Session.flush()
+        Session.expunge_all()
+        request = testing.DummyRequest(params={'filter[id]': '7,6,5,4,3,2,1'})
+        with mock.patch('honeygen_pyramid.base_model.IDS_PER_QUERY', 3), QueryRecorder() as recorder:
+            result = call_view(User, 'list', request=request)
+        self.assertEqual([user['id'] for user in result['data']], [7, 6, 5, 4, 3, 2, 1])
+        self.assertEqual([len(parameters) for _, parameters in recorder.statements], [3, 3, 1])
+
+    def test_list_by_equivalent_ids(self):
+        request = testing.DummyRequest(params={'filter[id]': '01,1'})
+        result = call_view(User, 'list', request=request)
+        self.assertEqual([user['id'] for user in result['data']], [1, 1])
+
+    def test_list_by_ids_not_found(self):
+        request = testing.DummyRequest(params={'filter[id]': '1,3,abc'})
+        with self.assertRaises(MultipleNotFoundException) as context:
+            call_view(User, 'list', request=request)
+        errors = exception_view(context.exception, request)['errors']
+        self.assertEqual(request.response.status_code, 404)
+        self.assertEqual(errors, [
+            {'status': '404', 'detail': 'Cannot find user identified by "3"'},
+            {'status': '404', 'detail': 'Cannot find user identified by "abc"'},
+        ])
@@ -19,6 +19,10 @@ requires = [
     'PyJWT',
 ]
 
+tests_require = [
+    'WebTest',
+]
+
 setup(name='honeygen_pyramid',
       version='0.0',
       description='honeygen_pyramid',
@@ -38,10 +42,17 @@ setup(name='honeygen_pyramid',
       zip_safe=False,
       test_suite='honeygen_pyramid.tests',
       install_requires=requires,
+      tests_require=tests_require,
+      extras_require={
+          'testing': tests_require,
+          'brotli': ['brotli'],
+      },
       entry_points="""\
       [paste.app_factory]
       main = honeygen_pyramid:main
       [console_scripts]
       initialize_honeygen_pyramid_db = honeygen_pyramid.scripts.initializedb:main
+      benchmark_honeygen_pyramid = honeygen_pyramid.scripts.benchmark:main
+      report_honeygen_pyramid_slowlog = honeygen_pyramid.scripts.slowlog_report:main
       """,
       )